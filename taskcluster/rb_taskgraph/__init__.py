@@ -3,6 +3,7 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
+import os
 from importlib import import_module
 
 
@@ -13,6 +14,11 @@ def register(graph_config):
     """
     _import_modules(["job", "worker_types", "routes", "target_tasks"])
 
+    if os.environ.get("RB_TASKGRAPH_PROFILE"):
+        from .profiler import install
+
+        install(os.environ["RB_TASKGRAPH_PROFILE"])
+
 
 def _import_modules(modules):
     for module in modules:
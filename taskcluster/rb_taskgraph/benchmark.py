@@ -0,0 +1,314 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Time graph generation against a synthetic graph many times the size of ours,
+so that changes to the loaders and transforms can be compared between commits
+before the graph actually grows that big.
+
+Run it from the taskcluster directory:
+
+    python -m rb_taskgraph.benchmark --build-types 50 --raptor-kinds 4
+
+The repository is copied to a temporary directory and its kinds extended
+there: the build kind gets `--build-types` more variants, each with `--abis`
+APKs, which the signing kind then signs, and `--raptor-kinds` kinds of
+`--tests` tests, split in `--chunks`, each run against every one of those
+APKs, through the raptor and notify transforms. Then the full, target and optimized graphs are
+generated from it, with the profiler recording the time and peak memory of
+each kind and the time spent in each of its transforms.
+
+Nothing talks to Taskcluster: index lookups are answered by a local stand-in,
+which finds a deterministic `--cached` fraction of our index paths it is asked
+about, as if a previous push had built those tasks.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+from taskgraph.generator import TaskGraphGenerator
+from taskgraph.optimize import base as optimize_base
+from taskgraph.optimize import strategies as optimize_strategies
+from taskgraph.parameters import Parameters
+from taskgraph.transforms.base import TransformSequence
+
+from . import benchmarking, gradle, profiler
+from . import target_tasks as rb_target_tasks
+
+
+ROOT = Path(__file__).resolve().parents[2]
+ABIS = ("arm64-v8a", "armeabi-v7a", "x86_64", "x86", "armeabi", "mips")
+NEVER_EXPIRES = "3000-01-01T00:00:00.000Z"
+# What local builds and tools leave in the checkout, none of which graph
+# generation looks at.
+IGNORED = shutil.ignore_patterns(
+    ".git",
+    ".gradle",
+    ".idea",
+    ".pytest_cache",
+    "*.iml",
+    "__pycache__",
+    "local.properties",
+)
+
+# What the raptor kinds' tasks still need once the raptor transforms are done
+# with them, before the run and task transforms.
+transforms = TransformSequence()
+
+
+@transforms.add
+def depend_on_build(config, tasks):
+    for task in tasks:
+        dep_task = task.pop("primary-dependency")
+        attributes = task["attributes"]
+        task["treeherder"] = {
+            "kind": "test",
+            "platform": f"android-{attributes['abi']}/{attributes['build-type']}",
+            "symbol": f"{config.kind}-{task['name']}",
+            "tier": 2,
+        }
+        task["name"] = f"{task['name']}-{attributes['build-type']}-{attributes['abi']}"
+        task["dependencies"] = {"build": dep_task.label}
+        yield task
+
+
+class LocalIndex:
+    """Stands in for the Taskcluster index and queue.
+
+    Paths outside of our trust domain, like the upstream Gecko tasks', are
+    always found. Ours are found if their digest falls within the cached
+    fraction, so the same paths are found on every run and for every
+    revision."""
+
+    def __init__(self, cached, trust_domain="mobile"):
+        self.cached = cached
+        self.prefix = f"{trust_domain}."
+        self.lookups = 0
+
+    def find_task_id(self, index_path):
+        self.lookups += 1
+        digest = hashlib.sha256(index_path.encode()).digest()
+        cached = int.from_bytes(digest[:4], "big") < self.cached * 2**32
+        if index_path.startswith(self.prefix) and not cached:
+            raise KeyError(index_path)
+        return digest[:16].hex()
+
+    def find_task_id_batched(self, index_paths):
+        found = {}
+        for index_path in index_paths:
+            try:
+                found[index_path] = self.find_task_id(index_path)
+            except KeyError:
+                pass
+        return found
+
+    def status_task(self, task_id):
+        return {"state": "completed", "expires": NEVER_EXPIRES}
+
+    def status_task_batched(self, task_ids):
+        return {task_id: self.status_task(task_id) for task_id in task_ids}
+
+    def install(self):
+        optimize_base.find_task_id_batched = self.find_task_id_batched
+        optimize_base.status_task_batched = self.status_task_batched
+        optimize_strategies.find_task_id = self.find_task_id
+        optimize_strategies.status_task = self.status_task
+        rb_target_tasks.find_task_id = self.find_task_id
+
+
+def synthetic_variants(build_types, abis):
+    return [
+        {
+            "apks": [
+                {"abi": abi, "fileName": f"app-{abi}-synthetic{number}.apk"}
+                for abi in ABIS[:abis]
+            ],
+            "build_type": f"synthetic{number}",
+            "name": f"synthetic{number}",
+        }
+        for number in range(build_types)
+    ]
+
+
+def _write_kind(path, config):
+    path.mkdir(parents=True, exist_ok=True)
+    with (path / "kind.yml").open("w") as fh:
+        yaml.safe_dump(config, fh, default_flow_style=False)
+
+
+def _ignore(directory, names):
+    ignored = IGNORED(directory, names)
+    # Gradle builds into a build directory next to each project's build
+    # script; the build kind is a directory called build too.
+    if "build" in names and {"build.gradle", "build.gradle.kts"} & set(names):
+        ignored.add("build")
+    return ignored
+
+
+def generate(workdir, build_types, abis, raptor_kinds, tests, chunks=1):
+    """Copy the repository to `workdir` and extend its kinds, returning the
+    taskcluster directory of the copy."""
+    shutil.copytree(ROOT, workdir, ignore=_ignore)
+    kinds = workdir / "taskcluster" / "kinds"
+
+    variants_file = workdir / "taskcluster" / gradle.VARIANTS_FILE
+    variants = json.loads(variants_file.read_text())
+    variants_file.write_text(json.dumps(variants + synthetic_variants(build_types, abis)))
+
+    build_kind = yaml.safe_load((kinds / "build" / "kind.yml").read_text())
+    for variant in synthetic_variants(build_types, abis):
+        build_kind["tasks"][variant["build_type"]] = {
+            "run-on-tasks-for": ["github-push"],
+            "run": {"gradlew": [f"assemble{variant['build_type'].capitalize()}"]},
+        }
+    _write_kind(kinds / "build", build_kind)
+
+    # Chunked tests split four pages a chunk between them, some pages taking
+    # longer than others.
+    pages = [f"page{number}" for number in range(4 * chunks)]
+    test = {"chunks": chunks, "pages": pages} if chunks > 1 else {}
+    for number in range(raptor_kinds):
+        _write_kind(kinds / f"raptor{number}", {
+            "loader": "taskgraph.loader.transform:loader",
+            "kind-dependencies": ["build"],
+            "only-for-build-types": [f"synthetic{n}" for n in range(build_types)],
+            "only-for-abis": list(ABIS[:abis]),
+            "transforms": [
+                "rb_taskgraph.transforms.raptor:transforms",
+                "rb_taskgraph.transforms.notify:transforms",
+                "rb_taskgraph.benchmark:transforms",
+                "taskgraph.transforms.run:transforms",
+                "taskgraph.transforms.task:transforms",
+            ],
+            "task-defaults": {
+                "description": "Synthetic performance test",
+                "notify": {
+                    "by-level": {
+                        "3": {
+                            "email": {
+                                "content": "This calls for an action of the Performance team.",
+                                "link": {
+                                    "text": "Treeherder Job",
+                                    "href": "https://treeherder.mozilla.org/#/jobs?repo={product_name}&revision={head_rev}&searchStr={task_name}",
+                                },
+                                "on-reasons": ["failed"],
+                                "subject": "[{product_name}] Raptor job \"{task_name}\" failed",
+                                "to-addresses": ["perftest-alerts@mozilla.com"],
+                            },
+                        },
+                        "default": {},
+                    },
+                },
+                "run": {"using": "run-task", "command": "true"},
+                "worker-type": "b-android",
+                "worker": {"docker-image": {"in-tree": "base"}, "max-run-time": 3600},
+            },
+            "page-weights": "page-weights.yml",
+            "tasks": {f"test{n}": test for n in range(tests)},
+        })
+        with (kinds / f"raptor{number}" / "page-weights.yml").open("w") as fh:
+            yaml.safe_dump({page: 10 + n % 7 * 5 for n, page in enumerate(pages)}, fh)
+
+    return workdir / "taskcluster"
+
+
+def generate_graphs(parameters):
+    """Return how long generating each graph took and how many tasks it
+    had."""
+    profiler.reset()
+    generator = TaskGraphGenerator("taskcluster", parameters)
+    results = {}
+    start = time.monotonic()
+    for graph in ("full_task_graph", "target_task_graph", "optimized_task_graph"):
+        tasks = len(getattr(generator, graph).tasks)
+        results[graph] = {"seconds": time.monotonic() - start, "tasks": tasks}
+        start = time.monotonic()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--build-types", type=int, default=20)
+    parser.add_argument("--abis", type=int, choices=range(1, len(ABIS) + 1), default=3)
+    parser.add_argument("--raptor-kinds", type=int, default=4)
+    parser.add_argument("--tests", type=int, default=5, help="tests in each raptor kind")
+    parser.add_argument("--chunks", type=int, default=1, help="chunks of each raptor test")
+    parser.add_argument(
+        "--cached",
+        type=float,
+        default=0.5,
+        metavar="FRACTION",
+        help="fraction of index paths the local index finds (default: %(default)s)",
+    )
+    parser.add_argument("--target-tasks-method", default="default")
+    parser.add_argument("--tasks-for", default="github-push")
+    parser.add_argument("--level", default="3")
+    benchmarking.add_arguments(parser, "where to copy the repository")
+    args = parser.parse_args()
+
+    index = LocalIndex(args.cached)
+    index.install()
+    profiler.install()
+
+    workdir = Path(tempfile.mkdtemp(dir=args.workdir, prefix="benchmark-"))
+    try:
+        # GraphConfig wants the graph's root to be called taskcluster.
+        root = generate(
+            workdir / "repository",
+            args.build_types,
+            args.abis,
+            args.raptor_kinds,
+            args.tests,
+            args.chunks,
+        )
+        parameters = Parameters(
+            strict=False,
+            repo_root=str(root.parent),
+            head_repository="https://github.com/mozilla-mobile/reference-browser",
+            base_repository="https://github.com/mozilla-mobile/reference-browser",
+            head_rev="0" * 40,
+            base_rev="0" * 40,
+            head_ref="master",
+            project="reference-browser",
+            repository_type="git",
+            level=args.level,
+            tasks_for=args.tasks_for,
+            target_tasks_method=args.target_tasks_method,
+        )
+        # Taskgraph finds the files it hashes, among others, relative to the
+        # current directory.
+        os.chdir(root.parent)
+        runs = [generate_graphs(parameters) for _ in range(args.repeat)]
+    finally:
+        os.chdir(ROOT / "taskcluster")
+        shutil.rmtree(workdir)
+
+    benchmarking.report(args, {
+        "index_lookups": index.lookups // args.repeat,
+        "graphs": {
+            graph: {
+                "seconds": statistics.median(run[graph]["seconds"] for run in runs),
+                "tasks": runs[0][graph]["tasks"],
+            }
+            for graph in runs[0]
+        },
+        # Of the last run only: the kinds' peaks are those of the generation
+        # as a whole, as the transforms of a kind all run interleaved.
+        "profile": profiler.get_profile(),
+    })
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+What the benchmarks have in common: the options to repeat a run, where to do
+it and where to write the results, and the results' description of what was
+run where, so that those of two commits can be told apart and compared.
+
+It only uses the standard library, so that the benchmarks of the scripts can
+import it without taskgraph installed.
+"""
+
+import json
+import os
+import platform
+import subprocess
+from pathlib import Path
+
+
+def add_arguments(parser, workdir_help):
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="times to run the benchmark; the median is reported (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--workdir",
+        type=Path,
+        help=f"{workdir_help} (default: a temporary directory)",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        help="JSON file to write the results to, as well as printing them",
+    )
+
+
+def current_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def report(args, results):
+    """Print `results`, after the revision, environment and parameters they
+    were measured with, and write them to `args.output` if given."""
+    results = {
+        "revision": current_revision(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "parameters": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ("workdir", "output")
+        },
+        **results,
+    }
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with args.output.open("w") as fh:
+            json.dump(results, fh, indent=2)
+            fh.write("\n")
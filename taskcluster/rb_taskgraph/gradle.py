@@ -5,47 +5,55 @@
 
 # /!\ This implementation differs from what android-components, fenix, and focus have.
 # The main reason is: a-c is much more complex and subject to changes. The 3 projects
-# being in the same repo, they all follow the same model. This means, there's a
-# mechanism to ensure the content of `gradlew printVariants` stays in sync with the
-# .buildconfig.yml files.
+# being in the same repo, they all follow the same model.
 #
-# Here, we're just tracking a handful build_types, so we don't need the same complexity
-# as what was introduced in https://github.com/mozilla-mobile/firefox-android/pull/340.
-#
-# If you want to update this variable, just run `gradlew printVariants` and copy-paste
-# the result.
-_ALL_VARIANTS = [
-    {
-        "apks": [
-            {"abi": "arm64-v8a", "fileName": "app-arm64-v8a-debug.apk"},
-            {"abi": "armeabi-v7a", "fileName": "app-armeabi-v7a-debug.apk"},
-            {"abi": "x86_64", "fileName": "app-x86_64-debug.apk"},
-        ],
-        "build_type": "debug",
-        "name": "debug",
-    }, {
-        "apks": [
-            {"abi": "arm64-v8a", "fileName": "app-arm64-v8a-nightly-unsigned.apk"},
-            {"abi": "armeabi-v7a", "fileName": "app-armeabi-v7a-nightly-unsigned.apk"},
-            {"abi": "x86_64", "fileName": "app-x86_64-nightly-unsigned.apk"},
-        ],
-        "build_type": "nightly",
-        "name": "nightly",
-    }
-]
-
-
-def get_build_variant(build_type):
-    matching_variants = [
-        variant for variant in _ALL_VARIANTS
-        if variant["build_type"] == build_type
-    ]
-    number_of_matching_variants = len(matching_variants)
-    if number_of_matching_variants == 0:
-        raise ValueError(f'No variant found for build type "{build_type}"')
-    elif number_of_matching_variants > 1:
-        raise ValueError('Too many variants found for build type "{}": {}'.format(
-            build_type, matching_variants
-        ))
-
-    return matching_variants.pop()
+# Here, the variants come from taskcluster/variants.json, which is what
+# `gradlew printVariants` prints. If you want to update it, run
+# `./gradlew printVariants -PvariantsOutput=taskcluster/variants.json`. The
+# `lint-variants` task fails when the two drift apart.
+
+
+import functools
+import json
+import os
+
+# printVariants' keys aren't the dashed ones taskgraph's Schema insists on.
+from voluptuous import Any, Required, Schema
+
+
+VARIANTS_FILE = "variants.json"
+
+variants_schema = Schema([{
+    Required("apks"): [{
+        # Gradle gives no ABI for a universal APK.
+        Required("abi"): Any(str, None),
+        Required("fileName"): str,
+    }],
+    Required("build_type"): str,
+    Required("name"): str,
+}])
+
+
+@functools.lru_cache(maxsize=None)
+def load_variants(root_dir):
+    """Return the variants in `root_dir`'s variants.json, indexed by build
+    type. They are only read once per decision task."""
+    with open(os.path.join(root_dir, VARIANTS_FILE)) as f:
+        variants = variants_schema(json.load(f))
+
+    by_build_type = {}
+    for variant in variants:
+        build_type = variant["build_type"]
+        if build_type in by_build_type:
+            raise ValueError('Too many variants found for build type "{}": {}'.format(
+                build_type, [by_build_type[build_type], variant]
+            ))
+        by_build_type[build_type] = variant
+    return by_build_type
+
+
+def get_build_variant(root_dir, build_type):
+    try:
+        return load_variants(os.path.abspath(root_dir))[build_type]
+    except KeyError:
+        raise ValueError(f'No variant found for build type "{build_type}"') from None
@@ -3,10 +3,13 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 
+import json
+
 from taskgraph.transforms.run import run_task_using, configure_taskdesc_for_run
+from taskgraph.transforms.run.common import add_cache
 from taskgraph.util import path
 from taskgraph.util.schema import Schema, taskref_or_string
-from voluptuous import Required, Optional
+from voluptuous import Any, Required, Optional
 
 from pipes import quote as shell_quote
 
@@ -36,6 +39,14 @@ gradlew_schema = Schema({
     Optional("use-caches"): bool,
     Optional("secrets"): [secret_schema],
     Optional("dummy-secrets"): [dummy_secret_schema],
+    # Check the fetched android-gradle-dependencies against the manifest it
+    # ships, comparing either only file sizes or full checksums.
+    Optional("verify-dependencies"): Any("sizes", "checksums"),
+    # Time each step of the command and publish the results as public/timings.json.
+    Optional("timings"): bool,
+    # Run Gradle with --profile and publish its report, along with a summary of
+    # it, as public/gradle-profile.
+    Optional("profile"): bool,
 })
 
 run_commands_schema = Schema({
@@ -43,26 +54,29 @@ run_commands_schema = Schema({
     Optional("pre-commands"): [[str]],
     Required("commands"): [[taskref_or_string]],
     Required("workdir"): str,
-    Optional("use-caches"): bool,
     Optional("secrets"): [secret_schema],
     Optional("dummy-secrets"): [dummy_secret_schema],
+    Optional("timings"): bool,
 })
 
 
 @run_task_using("docker-worker", "run-commands", schema=run_commands_schema)
 def configure_run_commands_schema(config, job, taskdesc):
     run = job["run"]
-    pre_commands = run.pop("pre-commands", [])
-    pre_commands += [
-        _generate_dummy_secret_command(secret) for secret in run.pop("dummy-secrets", [])
+    steps = [("pre-commands", command) for command in run.pop("pre-commands", [])]
+    steps += [
+        ("dummy-secrets", _generate_dummy_secret_command(secret))
+        for secret in run.pop("dummy-secrets", [])
     ]
-    pre_commands += [
-        _generate_secret_command(secret) for secret in run.get("secrets", [])
-    ]
-
-    all_commands = pre_commands + run.pop("commands", [])
-
-    run["command"] = _convert_commands_to_string(all_commands)
+    if run.get("secrets"):
+        steps.append(("secrets", _generate_secrets_command(run["secrets"])))
+    steps += [("commands", command) for command in run.pop("commands", [])]
+
+    timings_file = _add_timings_artifact(run, job["worker"]) if run.pop("timings", False) else None
+    run["command"] = _convert_commands_to_string(_time_steps(steps, timings_file))
+    # Only gradlew tasks know how to use the Gradle caches, and these don't get
+    # run-task's checkout cache either.
+    run["use-caches"] = False
     _inject_secrets_scopes(run, taskdesc)
     _set_run_task_attributes(job)
     configure_taskdesc_for_run(config, job, taskdesc, job["worker"]["implementation"])
@@ -74,26 +88,98 @@ def configure_gradlew(config, job, taskdesc):
     worker = taskdesc["worker"] = job["worker"]
 
     fetches_dir = path.join(run["workdir"], worker["env"]["MOZ_FETCHES_DIR"])
+    # Each android-sdk-* toolchain the task fetches unpacks its component into
+    # the same directory, which makes up an SDK of just those components.
     worker.setdefault("env", {}).update({
         "ANDROID_SDK_ROOT": path.join(fetches_dir, "android-sdk-linux"),
     })
 
-    run["command"] = _extract_gradlew_command(run, fetches_dir)
+    gradle_args = []
+    if run.get("use-caches"):
+        gradle_args += _add_gradle_caches(job, taskdesc)
+    profile_dir = None
+    if run.pop("profile", False):
+        profile_dir = _add_profile_artifact(run, worker)
+        gradle_args.append("--profile")
+
+    timings_file = _add_timings_artifact(run, worker) if run.pop("timings", False) else None
+    run["command"] = _extract_gradlew_command(run, fetches_dir, gradle_args, timings_file, profile_dir)
     _inject_secrets_scopes(run, taskdesc)
     _set_run_task_attributes(job)
     configure_taskdesc_for_run(config, job, taskdesc, job["worker"]["implementation"])
 
 
-def _extract_gradlew_command(run, fetches_dir):
-    pre_gradle_commands = run.pop("pre-gradlew", [])
-    pre_gradle_commands += [
-        _generate_dummy_secret_command(secret) for secret in run.pop("dummy-secrets", [])
+def _add_gradle_caches(job, taskdesc):
+    """Mount persistent caches for Gradle's user home and its local build cache,
+    returning the arguments that point ./gradlew at them.
+
+    Taskgraph scopes the caches to the level of the task and adds the scopes
+    needed to use them. Their mount points have to be volumes in the image.
+    """
+    workdir = job["run"]["workdir"]
+    gradle_user_home = path.join(workdir, ".gradle")
+    build_cache_dir = path.join(workdir, ".gradle-build-cache")
+    add_cache(job, taskdesc, "gradle-user-home", gradle_user_home)
+    add_cache(job, taskdesc, "gradle-build-cache", build_cache_dir)
+    return [
+        f"--gradle-user-home={gradle_user_home}",
+        "--build-cache",
+        f"-PlocalBuildCacheDir={build_cache_dir}",
     ]
-    pre_gradle_commands += [
-        _generate_secret_command(secret) for secret in run.get("secrets", [])
+
+
+def _add_timings_artifact(run, worker):
+    artifacts_dir = path.join(run["workdir"], "artifacts")
+    timings_file = path.join(artifacts_dir, "timings.json")
+    artifacts = worker.setdefault("artifacts", [])
+    # Tasks publishing the whole artifacts directory publish the timings with it.
+    if not any(artifact["path"] == artifacts_dir for artifact in artifacts):
+        artifacts.append({
+            "type": "file",
+            "name": "public/timings.json",
+            "path": timings_file,
+        })
+    return timings_file
+
+
+def _add_profile_artifact(run, worker):
+    profile_dir = path.join(run["workdir"], "checkouts", "vcs", "build", "reports", "profile")
+    worker.setdefault("artifacts", []).append({
+        "type": "directory",
+        "name": "public/gradle-profile",
+        "path": profile_dir,
+    })
+    return profile_dir
+
+
+def _time_steps(steps, timings_file):
+    if not timings_file:
+        return [command for _, command in steps]
+
+    return [
+        ["taskcluster/scripts/timed-step.py", "--output", timings_file, "--name", name, "--"] + command
+        for name, command in steps
     ]
 
+
+def _extract_gradlew_command(run, fetches_dir, gradle_args, timings_file=None, profile_dir=None):
     maven_dependencies_dir = path.join(fetches_dir, "android-gradle-dependencies")
+
+    steps = []
+    verify_dependencies = run.pop("verify-dependencies", None)
+    if verify_dependencies:
+        steps.append((
+            "verify-dependencies",
+            _generate_verify_dependencies_command(maven_dependencies_dir, verify_dependencies),
+        ))
+    steps += [("pre-gradlew", command) for command in run.pop("pre-gradlew", [])]
+    steps += [
+        ("dummy-secrets", _generate_dummy_secret_command(secret))
+        for secret in run.pop("dummy-secrets", [])
+    ]
+    if run.get("secrets"):
+        steps.append(("secrets", _generate_secrets_command(run["secrets"])))
+
     gradle_repos_args = [
         "-P{property_name}=file://{dir}/{repo_name}".format(
             dir=maven_dependencies_dir, property_name=property_name, repo_name=repo_name
@@ -104,25 +190,47 @@ def _extract_gradlew_command(run, fetches_dir):
             ("pluginRepo", "gradle-plugins"),
         )
     ]
-    gradle_command = ["./gradlew"] + gradle_repos_args + ["listRepositories"] + run.pop("gradlew")
-    post_gradle_commands = run.pop("post-gradlew", [])
-
-    commands = pre_gradle_commands + [gradle_command] + post_gradle_commands
+    gradle_command = (
+        ["./gradlew"] + gradle_args + gradle_repos_args + ["listRepositories"] + run.pop("gradlew")
+    )
+    steps.append(("gradlew", gradle_command))
+    if profile_dir:
+        steps.append(("gradle-profile", _generate_profile_summary_command(profile_dir)))
+    steps += [("post-gradlew", command) for command in run.pop("post-gradlew", [])]
+
+    commands = _time_steps(steps, timings_file)
     shell_quoted_commands = [" ".join(map(shell_quote, command)) for command in commands]
     return " && ".join(shell_quoted_commands)
 
 
-def _generate_secret_command(secret):
-    secret_command = [
+def _generate_secrets_command(secrets):
+    # A single invocation fetches each secret once, however many of its keys
+    # are written out.
+    return [
         "taskcluster/scripts/get-secret.py",
-        "-s", secret["name"],
-        "-k", secret["key"],
-        "-f", secret["path"],
+        "--manifest", json.dumps(secrets, sort_keys=True),
     ]
-    if secret.get("json"):
-        secret_command.append("--json")
 
-    return secret_command
+
+def _generate_verify_dependencies_command(maven_dependencies_dir, mode):
+    verify_command = [
+        "python3",
+        "taskcluster/scripts/toolchain/android-gradle-dependencies/verify_dependencies.py",
+        "--manifest", path.join(maven_dependencies_dir, "manifest.txt"),
+    ]
+    if mode == "sizes":
+        verify_command.append("--sizes-only")
+
+    return verify_command
+
+
+def _generate_profile_summary_command(profile_dir):
+    return [
+        "python3",
+        "taskcluster/scripts/summarize-gradle-profile.py",
+        "--output", path.join(profile_dir, "summary.json"),
+        profile_dir,
+    ]
 
 
 def _generate_dummy_secret_command(secret):
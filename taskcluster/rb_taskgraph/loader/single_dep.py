@@ -13,6 +13,60 @@ from taskgraph.util.schema import Schema
 schema = Schema({Required("primary-dependency", "primary dependency task"): Task})
 
 
+class _KindIndex:
+    """The loaded tasks by kind.
+
+    The generator gives each kind a new list of every task loaded before it,
+    kind after kind, so each list starts with the one before. Only the tasks
+    that weren't in the last list are indexed, rather than all of them being
+    scanned again for every kind."""
+
+    def __init__(self):
+        self.tasks = {}
+        self.first = self.last = None
+        self.count = 0
+
+    def update(self, loaded_tasks):
+        count = self.count
+        if count and (
+            len(loaded_tasks) < count
+            or loaded_tasks[0] is not self.first
+            or loaded_tasks[count - 1] is not self.last
+        ):
+            # Another graph's tasks.
+            self.__init__()
+            count = 0
+        for task in loaded_tasks[count:]:
+            self.tasks.setdefault(task.kind, []).append(task)
+        if loaded_tasks:
+            self.first, self.last = loaded_tasks[0], loaded_tasks[-1]
+        self.count = len(loaded_tasks)
+
+
+_index = _KindIndex()
+
+
+def _dependencies(loaded_tasks, kinds, only_attributes):
+    """Return the tasks of `kinds` having any of `only_attributes`, if given,
+    in the order they were loaded."""
+    _index.update(loaded_tasks)
+    # The kinds are in the order their tasks were first loaded, and a kind's
+    # tasks are loaded together.
+    dependencies = [
+        task
+        for kind, tasks in _index.tasks.items()
+        if kind in kinds
+        for task in tasks
+    ]
+    if only_attributes:
+        only_attributes = set(only_attributes)
+        dependencies = [
+            task for task in dependencies
+            if not only_attributes.isdisjoint(task.attributes)
+        ]
+    return dependencies
+
+
 def loader(kind, path, config, params, loaded_tasks):
     """
     Load tasks based on the jobs dependant kinds.
@@ -24,22 +78,13 @@ def loader(kind, path, config, params, loaded_tasks):
     Optional `job-template` kind configuration value, if specified, will be used to
     pass configuration down to the specified transforms used.
     """
-    only_attributes = config.get("only-for-attributes")
-    job_template = config.get("job-template")
-
-    for task in loaded_tasks:
-        if task.kind not in config.get("kind-dependencies", []):
-            continue
-
-        if only_attributes:
-            config_attrs = set(only_attributes)
-            if not config_attrs & set(task.attributes):
-                # make sure any attribute exists
-                continue
-
-        job = {"primary-dependency": task}
-
-        if job_template:
-            job.update(copy.deepcopy(job_template))
+    job_template = config.get("job-template", {})
 
+    for task in _dependencies(
+        loaded_tasks,
+        set(config.get("kind-dependencies", [])),
+        config.get("only-for-attributes"),
+    ):
+        job = copy.deepcopy(job_template)
+        job["primary-dependency"] = task
         yield job
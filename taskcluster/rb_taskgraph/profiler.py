@@ -0,0 +1,231 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Profile where graph generation spends its time and memory.
+
+Set RB_TASKGRAPH_PROFILE to 1, or to the path of a JSON file, and `register`
+instruments every kind's loader, each step of its transforms and the payload
+builders. When the process exits, the profile is written to that file
+(artifacts/decision-profile.json by default, so the decision task publishes
+it): the wall time, task count and tracemalloc peak of each kind, and the time
+spent in each step along with how many tasks went in and came out of it. The
+same frames are written next to it in the collapsed-stack format flamegraph
+tools read.
+
+Transforms are generators chained into one another, so a step's time only
+counts what it spends itself, not what the steps feeding it spend.
+
+This replaces some of taskgraph's internals, so `install` first checks that
+they are still what it expects and refuses to go any further otherwise.
+"""
+
+
+import atexit
+import dataclasses
+import inspect
+import json
+import os
+import time
+import tracemalloc
+
+import taskgraph
+from taskgraph.generator import Kind
+from taskgraph.transforms import task as task_transforms
+from taskgraph.transforms.base import TransformSequence
+
+
+DEFAULT_OUTPUT = "artifacts/decision-profile.json"
+
+_kinds = {}
+_frames = {}
+# The frames currently running; each collects the time spent in the frames
+# called from it, so that it can be left out of its own.
+_stack = []
+_current_kind = None
+_installed = False
+
+# The taskgraph internals `install` replaces, and the parameters they take.
+_REPLACED = {
+    (Kind, "load_tasks"): ("self", "parameters", "loaded_tasks", "write_artifacts"),
+    (Kind, "_get_loader"): ("self",),
+    (TransformSequence, "__call__"): ("self", "config", "items"),
+}
+
+
+def _frame(stack):
+    if stack not in _frames:
+        _frames[stack] = {"stack": list(stack), "seconds": 0.0, "calls": 0}
+    return _frames[stack]
+
+
+def _timed_call(frame, func, *args):
+    running = {"frame": frame, "children": 0.0}
+    _stack.append(running)
+    start = time.monotonic()
+    try:
+        return func(*args)
+    finally:
+        elapsed = time.monotonic() - start
+        _stack.pop()
+        frame["seconds"] += elapsed - running["children"]
+        if _stack:
+            _stack[-1]["children"] += elapsed
+
+
+def _timed_iter(frame, iterable):
+    iterator = _timed_call(frame, iter, iterable)
+    frame.setdefault("tasks_out", 0)
+    while True:
+        try:
+            item = _timed_call(frame, next, iterator)
+        except StopIteration:
+            return
+        frame["tasks_out"] += 1
+        yield item
+
+
+def _counted(frame, items):
+    frame.setdefault("tasks_in", 0)
+    for item in items:
+        frame["tasks_in"] += 1
+        yield item
+
+
+def _name(obj):
+    name = getattr(obj, "__qualname__", type(obj).__qualname__)
+    return f"{getattr(obj, '__module__', type(obj).__module__)}:{name}"
+
+
+def _profiled_transforms(self, config, items):
+    for xform in self._transforms:
+        # Nested sequences are profiled step by step as well.
+        if isinstance(xform, TransformSequence):
+            items = xform(config, items)
+            continue
+
+        frame = _frame((config.kind, _name(xform)))
+        frame["calls"] += 1
+        result = _timed_call(frame, xform, config, _counted(frame, items))
+        if result is None:
+            raise Exception(f"Transform {xform} is not a generator")
+        items = _timed_iter(frame, result)
+    return items
+
+
+def _profiled_get_loader(original):
+    def get_loader(self):
+        loader = original(self)
+
+        def profiled_loader(kind, path, config, parameters, loaded_tasks):
+            frame = _frame((kind, f"loader:{_name(loader)}"))
+            frame["calls"] += 1
+            tasks = _timed_call(frame, loader, kind, path, config, parameters, loaded_tasks)
+            return _timed_iter(frame, tasks)
+
+        return profiled_loader
+
+    return get_loader
+
+
+def _profiled_load_tasks(original):
+    def load_tasks(self, parameters, loaded_tasks, write_artifacts):
+        global _current_kind
+        _current_kind = self.name
+        tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0]
+        start = time.monotonic()
+        try:
+            tasks = original(self, parameters, loaded_tasks, write_artifacts)
+        finally:
+            _current_kind = None
+        peak = tracemalloc.get_traced_memory()[1]
+        _kinds[self.name] = {
+            "seconds": time.monotonic() - start,
+            "tasks": len(tasks),
+            "peak_memory": peak,
+            "peak_memory_increase": peak - memory_before,
+        }
+        return tasks
+
+    return load_tasks
+
+
+def _profiled_builder(name, builder):
+    def profiled_builder(*args):
+        parent = _stack[-1]["frame"]["stack"] if _stack else [_current_kind]
+        frame = _frame(tuple(parent) + (f"payload-builder:{name}",))
+        frame["calls"] += 1
+        return _timed_call(frame, builder, *args)
+
+    return profiled_builder
+
+
+def get_profile():
+    return {
+        "kinds": _kinds,
+        "frames": list(_frames.values()),
+    }
+
+
+def reset():
+    """Forget what has been profiled so far."""
+    _kinds.clear()
+    _frames.clear()
+
+
+def write_profile(output):
+    profile = get_profile()
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(profile, f, indent=2)
+        f.write("\n")
+    with open(os.path.splitext(output)[0] + ".folded", "w") as f:
+        for frame in _frames.values():
+            f.write(f"{';'.join(frame['stack'])} {round(frame['seconds'] * 1e6)}\n")
+
+
+def _check_taskgraph():
+    """Raise if taskgraph's internals aren't what `install` replaces them
+    with."""
+    problems = []
+    for (cls, name), expected in _REPLACED.items():
+        parameters = tuple(inspect.signature(getattr(cls, name)).parameters)
+        if parameters != expected:
+            problems.append(
+                f"{cls.__name__}.{name} takes ({', '.join(parameters)}), "
+                f"not ({', '.join(expected)})"
+            )
+    if not isinstance(getattr(TransformSequence(), "_transforms", None), list):
+        problems.append("TransformSequence keeps no _transforms list")
+    fields = tuple(f.name for f in dataclasses.fields(task_transforms.PayloadBuilder))
+    if fields != ("schema", "builder"):
+        problems.append(f"PayloadBuilder has fields {fields}, not (schema, builder)")
+    if problems:
+        raise Exception(
+            f"The profiler doesn't support taskgraph {taskgraph.__version__}: "
+            + "; ".join(problems)
+        )
+
+
+def install(output=None):
+    """Instrument graph generation, writing the profile to `output`, if
+    given, on exit."""
+    global _installed
+    if output == "1":
+        output = DEFAULT_OUTPUT
+    if output:
+        atexit.register(write_profile, output)
+    if _installed:
+        return
+
+    _check_taskgraph()
+    _installed = True
+    tracemalloc.start()
+    TransformSequence.__call__ = _profiled_transforms
+    Kind._get_loader = _profiled_get_loader(Kind._get_loader)
+    Kind.load_tasks = _profiled_load_tasks(Kind.load_tasks)
+    for name, payload_builder in list(task_transforms.payload_builders.items()):
+        task_transforms.payload_builders[name] = task_transforms.PayloadBuilder(
+            payload_builder.schema, _profiled_builder(name, payload_builder.builder)
+        )
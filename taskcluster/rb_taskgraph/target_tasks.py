@@ -3,6 +3,7 @@
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import os
+from collections import defaultdict
 
 from redo import retry
 from taskgraph.target_tasks import register_target_task
@@ -20,13 +21,46 @@ def index_exists(index_path, reason=""):
         return False
 
 
+# The attribute index of the last graph asked about; a decision task only ever
+# has the one.
+_attribute_index = (None, None)
+
+
+def attribute_index(full_task_graph):
+    """Return the labels of the tasks in `full_task_graph` by attribute and
+    value, in the graph's order. Attributes whose values can't be hashed, like
+    lists, aren't indexed."""
+    global _attribute_index
+    graph, index = _attribute_index
+    if graph is not full_task_graph:
+        index = defaultdict(lambda: defaultdict(list))
+        for label, task in full_task_graph.tasks.items():
+            for attribute, value in task.attributes.items():
+                try:
+                    index[attribute][value].append(label)
+                except TypeError:
+                    pass
+        _attribute_index = (full_task_graph, index)
+    return index
+
+
+def tasks_with_attributes(full_task_graph, attributes):
+    """Return the labels of the tasks having all of `attributes`, with the
+    given values, in the graph's order."""
+    index = attribute_index(full_task_graph)
+    matches = [
+        index[attribute].get(value, [])
+        for attribute, value in attributes.items()
+    ]
+    if not matches:
+        return list(full_task_graph.tasks)
+    labels = set(matches[0]).intersection(*matches[1:])
+    return [label for label in matches[0] if label in labels]
+
+
 @register_target_task("nightly")
 def target_tasks_nightly(full_task_graph, parameters, graph_config):
     """Select the set of tasks required for a nightly build."""
-
-    def filter(task, parameters):
-        return task.attributes.get("nightly", False)
-
     index_path = (
         f"{graph_config['trust-domain']}.v2.{parameters['project']}.branch."
         f"{parameters['head_ref']}.revision.{parameters['head_rev']}.taskgraph.decision-nightly"
@@ -40,14 +74,10 @@ def target_tasks_nightly(full_task_graph, parameters, graph_config):
     ):
         return []
 
-    return [l for l, t in full_task_graph.tasks.items() if filter(t, parameters)]
+    return tasks_with_attributes(full_task_graph, {"nightly": True})
 
 
 @register_target_task("bump_android_components")
 def target_tasks_bump_android_components(full_task_graph, parameters, graph_config):
     """Select the set of tasks required to update android components."""
-
-    def filter(task, parameters):
-        return task.attributes.get("bump-type", "") == "android-components"
-
-    return [l for l, t in full_task_graph.tasks.items() if filter(t, parameters)]
+    return tasks_with_attributes(full_task_graph, {"bump-type": "android-components"})
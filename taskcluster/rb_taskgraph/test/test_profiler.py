@@ -0,0 +1,10 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from rb_taskgraph import profiler
+
+
+def test_taskgraph_internals_match():
+    # Fails when an upgrade of taskgraph changes what the profiler replaces.
+    profiler._check_taskgraph()
@@ -0,0 +1,112 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+from types import SimpleNamespace
+
+import pytest
+from taskgraph.task import Task
+
+from rb_taskgraph.transforms.raptor import add_variants, fill_email_data, split_chunks
+
+
+def test_variants_own_their_attributes():
+    build = Task(
+        kind="build",
+        label="build-nightly",
+        attributes={
+            "build-type": "nightly",
+            "apks": {"arm64-v8a": {"name": "app-arm64-v8a.apk"}},
+        },
+        task={},
+    )
+    config = SimpleNamespace(
+        config={"only-for-build-types": ["nightly"], "only-for-abis": ["arm64-v8a"]},
+        kind_dependencies_tasks={build.label: build},
+    )
+    tests = [{"name": "tp6", "attributes": {"raptor": True}}]
+    (task,) = add_variants(config, tests)
+    assert task["attributes"]["apk"] == {"name": "app-arm64-v8a.apk"}
+    task["attributes"]["apk"]["name"] = "changed.apk"
+    task["attributes"]["apks"].clear()
+    assert build.attributes["apks"] == {"arm64-v8a": {"name": "app-arm64-v8a.apk"}}
+
+
+
+def test_variants_own_their_definition():
+    build = Task(
+        kind="build",
+        label="build-nightly",
+        attributes={
+            "build-type": "nightly",
+            "apks": {abi: {"name": f"app-{abi}.apk"} for abi in ("arm64-v8a", "x86_64")},
+        },
+        task={},
+    )
+    config = SimpleNamespace(
+        config={"only-for-build-types": ["nightly"], "only-for-abis": ["arm64-v8a", "x86_64"]},
+        kind_dependencies_tasks={build.label: build},
+    )
+    test = {"name": "tp6", "run": {"command": ["run", "tp6"]}}
+    first, second = add_variants(config, [test])
+    assert first["primary-dependency"] is second["primary-dependency"] is build
+    first["run"]["command"].append("--fast")
+    assert second["run"]["command"] == ["run", "tp6"]
+    assert test["run"]["command"] == ["run", "tp6"]
+
+
+def _chunked_test(**run):
+    return {
+        "name": "tp6",
+        "chunks": 3,
+        "attributes": {
+            "apk": {"name": "app-arm64-v8a.apk"},
+            "apks": {"arm64-v8a": {"name": "app-arm64-v8a.apk"}},
+        },
+        "run": run,
+    }
+
+
+def test_chunks_own_their_attributes():
+    chunks = list(split_chunks(SimpleNamespace(config={}), [_chunked_test(command="run")]))
+    assert [chunk["run"]["command"] for chunk in chunks] == [
+        f"run --this-chunk={number} --total-chunks=3" for number in (1, 2, 3)
+    ]
+    chunks[0]["attributes"]["apk"]["name"] = "changed.apk"
+    chunks[0]["attributes"]["apks"].clear()
+    for chunk in chunks[1:]:
+        assert chunk["attributes"]["apk"] == {"name": "app-arm64-v8a.apk"}
+        assert chunk["attributes"]["apks"] == {"arm64-v8a": {"name": "app-arm64-v8a.apk"}}
+
+
+def test_chunks_need_a_command():
+    with pytest.raises(Exception, match="tp6 has chunks or pages but no run command"):
+        list(split_chunks(SimpleNamespace(config={}), [_chunked_test(using="run-task")]))
+
+def test_each_task_gets_its_own_email():
+    config = SimpleNamespace(
+        graph_config={"taskgraph": {"repositories": {"mobile": {"name": "RB"}}}},
+        params={"head_rev": "abc", "level": "3"},
+    )
+    tasks = [
+        {
+            "name": "tp6",
+            "notify": {
+                "email": {
+                    "link": {"text": "Job", "href": "{product_name}/{head_rev}"},
+                    "subject": "{task_name} failed",
+                    "to-addresses": ["perf@example.com"],
+                    "on-reasons": ["failed"],
+                },
+            },
+        }
+        for _ in range(2)
+    ]
+    first, second = fill_email_data(config, tasks)
+    assert first["notify"] == second["notify"]
+    assert first["notify"]["email"]["link"]["href"] == "rb/abc"
+    assert first["notify"]["email"]["subject"] == "tp6 failed"
+    assert first["notify"]["email"]["link"] is not second["notify"]["email"]["link"]
+    assert type(first["notify"]["email"]["to-addresses"]) is list
+    first["notify"]["email"]["link"]["text"] = "Changed"
+    assert second["notify"]["email"]["link"]["text"] == "Job"
@@ -0,0 +1,66 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+from taskgraph.task import Task
+
+from rb_taskgraph.loader.single_dep import loader
+
+
+TEMPLATE = {
+    "attributes": {"shipping-product": "fenix"},
+    "run-on-tasks-for": ["github-push"],
+    "worker": {"scopes": [{"names": ["a", "b"]}]},
+}
+
+
+def _tasks(kind, *names, **attributes):
+    return [
+        Task(kind=kind, label=f"{kind}-{name}", attributes=dict(attributes), task={})
+        for name in names
+    ]
+
+
+def _labels(kind, config, loaded_tasks):
+    return [job["primary-dependency"].label for job in loader(kind, "", config, {}, loaded_tasks)]
+
+
+@pytest.fixture
+def jobs():
+    config = {"kind-dependencies": ["build"], "job-template": TEMPLATE}
+    return list(loader("signing", "", config, {}, _tasks("build", "a", "b")))
+
+
+def test_jobs_are_independent(jobs):
+    first, second = jobs
+    assert first == dict(TEMPLATE, **{"primary-dependency": first["primary-dependency"]})
+    first["attributes"]["shipping-product"] = "focus"
+    first["run-on-tasks-for"].append("github-release")
+    del first["worker"]
+    assert second["attributes"] == TEMPLATE["attributes"]
+    assert second["run-on-tasks-for"] == ["github-push"]
+    assert second["worker"] == TEMPLATE["worker"]
+    assert TEMPLATE["run-on-tasks-for"] == ["github-push"]
+
+
+def test_dependencies_as_kinds_are_loaded():
+    build = _tasks("build", "a", "b")
+    lint = _tasks("lint", "a")
+    signing = _tasks("signing", "a", "b", shipping=True)
+    config = {"kind-dependencies": ["signing", "build"]}
+
+    assert _labels("signing", {"kind-dependencies": ["build"]}, build + lint) == [
+        "build-a",
+        "build-b",
+    ]
+    assert _labels("push", config, build + lint + signing) == [
+        "build-a",
+        "build-b",
+        "signing-a",
+        "signing-b",
+    ]
+    config["only-for-attributes"] = ["shipping"]
+    assert _labels("push", config, build + lint + signing) == ["signing-a", "signing-b"]
+    # Another graph's tasks, of the same kinds.
+    assert _labels("push", config, _tasks("signing", "c", shipping=True)) == ["signing-c"]
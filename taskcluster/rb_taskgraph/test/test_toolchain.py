@@ -0,0 +1,108 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import pytest
+
+from rb_taskgraph.transforms.toolchain import hash_declarations
+
+
+BUILD_GRADLE = """\
+// Top-level build file.
+subprojects {
+    apply plugin: 'jacoco'
+
+    afterEvaluate {
+        android {
+            buildFeatures {
+                viewBinding true
+            }
+        }
+    }
+}
+"""
+
+PATTERNS = ["*.gradle", "gradle.properties", "gradle/**"]
+
+
+@pytest.fixture
+def root(tmp_path):
+    (tmp_path / "build.gradle").write_text(BUILD_GRADLE)
+    (tmp_path / "gradle.properties").write_text("# Memory\norg.gradle.jvmargs=-Xmx4g\n")
+    (tmp_path / "gradle" / "wrapper").mkdir(parents=True)
+    (tmp_path / "gradle" / "libs.versions.toml").write_text(
+        '[versions]\njacoco = "0.8.12" # coverage\n'
+    )
+    (tmp_path / "gradle" / "wrapper" / "gradle-wrapper.jar").write_bytes(b"\x00\x01")
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "path,old,new",
+    [
+        pytest.param(
+            "build.gradle",
+            "apply plugin: 'jacoco'",
+            "apply plugin: 'jacoco'\n    apply plugin: 'pmd'",
+            id="apply-plugin",
+        ),
+        pytest.param(
+            "build.gradle",
+            "viewBinding true",
+            "viewBinding true\n                compose true",
+            id="build-feature",
+        ),
+        pytest.param(
+            "gradle/libs.versions.toml", '"0.8.12"', '"0.8.13"', id="catalog-version"
+        ),
+        pytest.param("gradle.properties", "-Xmx4g", "-Xmx8g", id="property"),
+    ],
+)
+def test_resolution_affecting_edit_changes_digest(root, path, old, new):
+    before = hash_declarations(root, PATTERNS)
+    file = root / path
+    file.write_text(file.read_text().replace(old, new))
+    assert hash_declarations(root, PATTERNS) != before
+
+
+@pytest.mark.parametrize(
+    "path,old,new",
+    [
+        pytest.param(
+            "build.gradle", "// Top-level build file.", "/* Reworded. */", id="comment"
+        ),
+        pytest.param(
+            "build.gradle", "afterEvaluate {", "afterEvaluate  {\n\n", id="whitespace"
+        ),
+        pytest.param("gradle.properties", "# Memory", "# Heap", id="property-comment"),
+        pytest.param(
+            "gradle/libs.versions.toml", "# coverage", "# JaCoCo", id="catalog-comment"
+        ),
+    ],
+)
+def test_cosmetic_edit_keeps_digest(root, path, old, new):
+    before = hash_declarations(root, PATTERNS)
+    file = root / path
+    file.write_text(file.read_text().replace(old, new))
+    assert hash_declarations(root, PATTERNS) == before
+
+
+def test_lines_are_not_joined(root):
+    properties = root / "gradle.properties"
+    properties.write_text("org.gradle.jvmargs=-Xmx4g\nandroid.useAndroidX=true\n")
+    two_lines = hash_declarations(root, PATTERNS)
+    properties.write_text("org.gradle.jvmargs=-Xmx4g android.useAndroidX=true\n")
+    assert hash_declarations(root, PATTERNS) != two_lines
+
+
+def test_binary_file_is_hashed_as_is(root):
+    before = hash_declarations(root, PATTERNS)
+    (root / "gradle" / "wrapper" / "gradle-wrapper.jar").write_bytes(b"\x00 \x01")
+    assert hash_declarations(root, PATTERNS) != before
+
+
+def test_string_contents_are_not_comments(root):
+    before = hash_declarations(root, PATTERNS)
+    file = root / "build.gradle"
+    file.write_text(file.read_text().replace("'jacoco'", "'jacoco // x'"))
+    assert hash_declarations(root, PATTERNS) != before
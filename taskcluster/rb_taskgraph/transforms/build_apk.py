@@ -19,7 +19,7 @@ transforms = TransformSequence()
 def add_artifacts(config, tasks):
     for task in tasks:
         build_type = task["attributes"]["build-type"]
-        variant_config = get_build_variant(build_type)
+        variant_config = get_build_variant(config.graph_config.root_dir, build_type)
         artifacts = task.setdefault("worker", {}).setdefault("artifacts", [])
         task["attributes"]["apks"] = apks = {}
         if "apk-artifact-template" in task:
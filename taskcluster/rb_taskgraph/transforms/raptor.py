@@ -7,20 +7,32 @@ kind.
 """
 
 
-import copy
 import json
+import shlex
 
 from taskgraph.transforms.base import TransformSequence
-from taskgraph.util.treeherder import inherit_treeherder_from_dep
+from taskgraph.util.treeherder import add_suffix, inherit_treeherder_from_dep
 from taskgraph.util.schema import resolve_keyed_by
+from taskgraph.util.yaml import load_yaml
 
 transforms = TransformSequence()
 
 
+def _copy(value):
+    """Copy the dicts and lists of a definition all the way down. Anything
+    else, like the Task a definition depends on, is shared, and unlike with
+    copy.deepcopy, nothing is kept track of along the way."""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
 @transforms.add
 def add_variants(config, tasks):
-    only_types = config.config["only-for-build-types"]
-    only_abis = config.config["only-for-abis"]
+    only_types = set(config.config["only-for-build-types"])
+    only_abis = set(config.config["only-for-abis"])
 
     tests = list(tasks)
 
@@ -33,14 +45,82 @@ def add_variants(config, tasks):
             if abi not in only_abis:
                 continue
             for test in tests:
-                test = copy.deepcopy(test)
-                attributes = copy.deepcopy(dep_task.attributes)
-                attributes.update(test.get("attributes", {}))
+                task = _copy(test)
+                # A copy all the way down, so that nothing changed in it
+                # shows in the build's attributes.
+                attributes = _copy(dep_task.attributes)
+                attributes.update(task.get("attributes", {}))
                 attributes["abi"] = abi
-                attributes["apk"] = apk
-                test["attributes"] = attributes
-                test["primary-dependency"] = dep_task
-                yield test
+                attributes["apk"] = _copy(apk)
+                task["attributes"] = attributes
+                task["primary-dependency"] = dep_task
+                yield task
+
+
+def balance_pages(pages, chunks, weights):
+    """Split `pages` into `chunks` lists taking about as long as one another,
+    given how long each page takes. Pages without a weight are taken to take
+    as long as the average page does. Each chunk keeps its pages in the order
+    they were given."""
+    default_weight = sum(weights.values()) / len(weights) if weights else 1
+    loads = [0] * chunks
+    assigned = [[] for _ in range(chunks)]
+    # Place the longest pages first, each in the chunk with the least to do.
+    for page in sorted(pages, key=lambda page: -weights.get(page, default_weight)):
+        chunk = loads.index(min(loads))
+        loads[chunk] += weights.get(page, default_weight)
+        assigned[chunk].append(page)
+    return [sorted(chunk, key=pages.index) for chunk in assigned]
+
+
+def _add_command_arguments(run, arguments):
+    if isinstance(run["command"], str):
+        run["command"] = " ".join([run["command"]] + [shlex.quote(a) for a in arguments])
+    else:
+        run["command"] = list(run["command"]) + arguments
+
+
+@transforms.add
+def split_chunks(config, tasks):
+    """Split tests with `chunks` into that many tasks, each running its share
+    of the test's `pages`, if it lists them, balanced by the weights in the
+    kind's `page-weights` file."""
+    weights_file = config.config.get("page-weights")
+    weights = load_yaml(config.path, weights_file) if weights_file else {}
+
+    for task in tasks:
+        total_chunks = task.pop("chunks", 1)
+        pages = task.pop("pages", None)
+        if total_chunks == 1 and not pages:
+            yield task
+            continue
+
+        if pages and total_chunks > len(pages):
+            raise Exception(
+                f"{task['name']} has {total_chunks} chunks but only {len(pages)} pages"
+            )
+        if "command" not in task.get("run", {}):
+            raise Exception(
+                f"{task['name']} has chunks or pages but no run command to pass them to"
+            )
+        pages_by_chunk = balance_pages(list(pages), total_chunks, weights) if pages else None
+        for this_chunk in range(1, total_chunks + 1):
+            chunk = _copy(task)
+            chunk["attributes"].update({
+                "this-chunk": this_chunk,
+                "total-chunks": total_chunks,
+            })
+            if total_chunks > 1:
+                chunk["name"] = f"{task['name']}-{this_chunk}"
+                if chunk.get("treeherder", {}).get("symbol"):
+                    chunk["treeherder"]["symbol"] = add_suffix(chunk["treeherder"]["symbol"], this_chunk)
+
+            arguments = [f"--this-chunk={this_chunk}", f"--total-chunks={total_chunks}"]
+            if pages_by_chunk:
+                arguments.extend(f"--page={page}" for page in pages_by_chunk[this_chunk - 1])
+            _add_command_arguments(chunk["run"], arguments)
+            yield chunk
+
 
 @transforms.add
 def fill_email_data(config, tasks):
@@ -49,14 +129,19 @@ def fill_email_data(config, tasks):
         "product_name": product_name.lower(),
         "head_rev": config.params["head_rev"],
     }
+    # The variants of a test all get the same email, so it's only formatted
+    # once.
+    formatted_by_name = {}
 
     for task in tasks:
-        format_kwargs["task_name"] = task["name"]
-
         resolve_keyed_by(task, 'notify', item_name=task["name"], level=config.params["level"])
         email = task["notify"].get("email")
         if email:
-            email["link"]["href"] = email["link"]["href"].format(**format_kwargs)
-            email["subject"] = email["subject"].format(**format_kwargs)
-
+            if task["name"] not in formatted_by_name:
+                format_kwargs["task_name"] = task["name"]
+                formatted_by_name[task["name"]] = (
+                    email["link"]["href"].format(**format_kwargs),
+                    email["subject"].format(**format_kwargs),
+                )
+            email["link"]["href"], email["subject"] = formatted_by_name[task["name"]]
         yield task
@@ -0,0 +1,119 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+Key toolchains on what their inputs say rather than on how they're written.
+
+A task's `dependency-declarations` lists the files that declare what Gradle
+resolves. Each of them is digested whole, but without its comments, its blank
+lines, or runs of whitespace within its lines, so that rewording a comment or
+reindenting a build script leaves the digest, and so the cached toolchain, as
+it was, while any edit that could change what Gradle resolves does not. Files
+that aren't source, like the wrapper's jar, are digested as they are.
+
+`transforms` has to run before `taskgraph.transforms.run`, which would reject
+the key, and `cache_transforms` after it, once the cache digest data is known.
+"""
+
+
+import hashlib
+from pathlib import Path
+
+from taskgraph.transforms.base import TransformSequence
+
+
+transforms = TransformSequence()
+cache_transforms = TransformSequence()
+
+
+# How line comments start in each kind of file whose comments are dropped,
+# besides properties files, where only whole lines are.
+_LINE_COMMENTS = {
+    ".gradle": "//",
+    ".java": "//",
+    ".kt": "//",
+    ".kts": "//",
+    ".toml": "#",
+}
+
+
+def _strip_comments(text, line_comment):
+    """Drop comments from `text`, leaving string literals alone."""
+    output = []
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char in "'\"":
+            end = i + 1
+            while end < len(text) and text[end] not in (char, "\n"):
+                end += 2 if text[end] == "\\" else 1
+            output.append(text[i:end + 1])
+            i = end + 1
+        elif text.startswith(line_comment, i):
+            i = text.find("\n", i)
+            if i == -1:
+                break
+        elif line_comment == "//" and text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = len(text) if end == -1 else end + 2
+        else:
+            output.append(char)
+            i += 1
+    return "".join(output)
+
+
+def _normalize(path):
+    if path.suffix == ".properties":
+        text = "\n".join(
+            line
+            for line in path.read_text().splitlines()
+            if not line.lstrip().startswith(("#", "!"))
+        )
+    elif path.suffix in _LINE_COMMENTS:
+        text = _strip_comments(path.read_text(), _LINE_COMMENTS[path.suffix])
+    else:
+        return path.read_bytes()
+    # Newlines end statements, so only the whitespace within lines is
+    # collapsed, and blank lines dropped.
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line).encode()
+
+
+def hash_declarations(root, patterns):
+    """Return a digest of the files matching `patterns`, and of those under
+    the directories matching them, ignoring their comments and formatting."""
+    paths = set()
+    for pattern in patterns:
+        for path in Path(root).glob(pattern):
+            if path.is_dir():
+                paths.update(file for file in path.rglob("*") if file.is_file())
+            elif path.is_file():
+                paths.add(path)
+    digest = hashlib.sha256()
+    for path in sorted(paths):
+        digest.update(f"{path.relative_to(root)}\0".encode())
+        digest.update(_normalize(path))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+@transforms.add
+def add_dependency_digest(config, tasks):
+    for task in tasks:
+        patterns = task.pop("dependency-declarations", None)
+        if patterns:
+            attributes = task.setdefault("attributes", {})
+            attributes["dependency-digest"] = hash_declarations(
+                config.graph_config.vcs_root, patterns
+            )
+        yield task
+
+
+@cache_transforms.add
+def key_cache_on_dependency_digest(config, tasks):
+    for task in tasks:
+        digest = task["attributes"].get("dependency-digest")
+        # There is no cache when generating the graph with --fast.
+        if digest and "cache" in task:
+            task["cache"]["digest-data"].append(digest)
+        yield task
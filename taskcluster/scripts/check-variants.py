@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Check that the variants taskgraph reads are the ones `gradlew printVariants`
+prints, and list what differs if they aren't.
+
+Neither the order of the variants nor that of their APKs matters.
+"""
+
+import argparse
+import json
+import sys
+
+
+def index(variants):
+    return {
+        variant["name"]: {
+            "build_type": variant["build_type"],
+            "apks": sorted(variant["apks"], key=lambda apk: (apk["abi"] or "", apk["fileName"])),
+        }
+        for variant in variants
+    }
+
+
+def drift(expected, actual):
+    """Return what differs between two lists of variants, one line each."""
+    expected, actual = index(expected), index(actual)
+    problems = []
+    for name in sorted(expected.keys() - actual.keys()):
+        problems.append(f"{name}: not printed by Gradle any more")
+    for name in sorted(actual.keys() - expected.keys()):
+        problems.append(f"{name}: printed by Gradle but missing")
+    for name in sorted(expected.keys() & actual.keys()):
+        if expected[name] != actual[name]:
+            problems.append(
+                f"{name}: expected {json.dumps(expected[name])}, Gradle printed {json.dumps(actual[name])}"
+            )
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("expected", help="the variants taskgraph reads, e.g. taskcluster/variants.json")
+    parser.add_argument("actual", help="what `gradlew printVariants -PvariantsOutput=...` wrote")
+    args = parser.parse_args()
+
+    with open(args.expected) as f:
+        expected = json.load(f)
+    with open(args.actual) as f:
+        actual = json.load(f)
+
+    problems = drift(expected, actual)
+    if problems:
+        print(f"{args.expected} has drifted from the Gradle build:", file=sys.stderr)
+        for problem in problems:
+            print(f"  {problem}", file=sys.stderr)
+        print(
+            f"Run `./gradlew printVariants -PvariantsOutput={args.expected}` to update it.",
+            file=sys.stderr,
+        )
+        return 1
+    print(f"{args.expected} matches the Gradle build")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
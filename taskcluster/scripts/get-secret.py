@@ -46,10 +46,21 @@ def fetch_secret_from_taskcluster(name):
     return secrets.get(name)
 
 
+def write_secrets_from_manifest(manifest):
+    # Several keys are often written from the same secret: fetch each of them once.
+    secrets = {}
+    for entry in manifest:
+        name = entry['name']
+        if name not in secrets:
+            secrets[name] = fetch_secret_from_taskcluster(name)
+        write_secret_to_file(entry['path'], secrets[name], entry['key'], json_secret=entry.get('json', False))
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Fetch a taskcluster secret value and save it to a file.')
 
+    parser.add_argument('--manifest', dest="manifest", action="store", type=json.loads, help='JSON list of {"name", "key", "path", "json"} secrets to save; replaces the other options')
     parser.add_argument('-s', dest="secret", action="store", help="name of the secret")
     parser.add_argument('-k', dest='key', action="store", help='key of the secret')
     parser.add_argument('-f', dest="path", action="store", help='file to save secret to')
@@ -60,6 +71,10 @@ def main():
 
     result = parser.parse_args()
 
+    if result.manifest is not None:
+        write_secrets_from_manifest(result.manifest)
+        return
+
     secret = fetch_secret_from_taskcluster(result.secret)
     write_secret_to_file(result.path, secret, result.key, result.decode, result.json, result.append, result.prefix)
 
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Summarise the report `gradlew --profile` writes into a compact JSON file:
+how long the build spent configuring and executing tasks, how long each task
+took, how many tasks were up to date or came from the build cache, and the
+slowest of them.
+
+Gradle only writes the report as HTML, a page with one table per tab, so the
+tables are read back out of it.
+"""
+
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+from html.parser import HTMLParser
+
+DURATION = re.compile(
+    r"^(?:(?P<d>\d+)d)?(?:(?P<h>\d+)h)?(?:(?P<m>\d+)m)?(?:(?P<s>\d+(?:\.\d+)?)s)?$"
+)
+
+
+class ProfileTables(HTMLParser):
+    """Collects the rows of every table in the report, keyed by the heading of
+    the tab holding it."""
+
+    def __init__(self):
+        super().__init__()
+        self.tables = {}
+        self._heading = None
+        self._text = None
+        self._row = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("h2", "td", "th"):
+            self._text = []
+        elif tag == "tr":
+            self._row = []
+
+    def handle_endtag(self, tag):
+        if tag == "h2" and self._text is not None:
+            self._heading = "".join(self._text).strip()
+            self._text = None
+        elif tag in ("td", "th") and self._text is not None and self._row is not None:
+            self._row.append("".join(self._text).strip())
+            self._text = None
+        elif tag == "tr" and self._row:
+            self.tables.setdefault(self._heading, []).append(self._row)
+            self._row = None
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+
+def parse_duration(text):
+    """Return the seconds in a duration as Gradle formats them, e.g. 1m2.345s."""
+    match = DURATION.match(text.strip())
+    if not match or not text.strip():
+        return None
+    parts = {unit: float(value or 0) for unit, value in match.groupdict().items()}
+    return parts["d"] * 86400 + parts["h"] * 3600 + parts["m"] * 60 + parts["s"]
+
+
+def summarize(report, top):
+    parser = ProfileTables()
+    with open(report) as f:
+        parser.feed(f.read())
+
+    summary = {
+        row[0]: parse_duration(row[1])
+        for row in parser.tables.get("Summary", [])
+        if len(row) == 2 and parse_duration(row[1]) is not None
+    }
+
+    tasks = []
+    for row in parser.tables.get("Task Execution", []):
+        if len(row) != 3 or parse_duration(row[1]) is None:
+            continue
+        task, duration, result = row
+        # Each project has a row of its own holding the total of its tasks.
+        if result == "(total)":
+            continue
+        tasks.append({"task": task, "seconds": parse_duration(duration), "result": result or "EXECUTED"})
+    tasks.sort(key=lambda task: (-task["seconds"], task["task"]))
+
+    results = {}
+    for task in tasks:
+        results[task["result"]] = results.get(task["result"], 0) + 1
+
+    return {
+        "report": os.path.basename(report),
+        "total_build_time": summary.get("Total Build Time"),
+        "configuration_time": summary.get("Configuring Projects"),
+        "task_execution_time": summary.get("Task Execution"),
+        "summary": summary,
+        "task_count": len(tasks),
+        "results": results,
+        "cache_hits": results.get("FROM-CACHE", 0),
+        "up_to_date": results.get("UP-TO-DATE", 0),
+        "slowest": tasks[:top],
+        "tasks": {task["task"]: task["seconds"] for task in tasks},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", required=True, help="JSON file to write the summary to")
+    parser.add_argument("--top", type=int, default=20, help="how many of the slowest tasks to list (default: %(default)s)")
+    parser.add_argument("reports_dir", help="directory Gradle wrote the profile to, e.g. build/reports/profile")
+    args = parser.parse_args()
+
+    reports = sorted(glob.glob(os.path.join(args.reports_dir, "profile-*.html")), key=os.path.getmtime)
+    if not reports:
+        print(f"No Gradle profile in {args.reports_dir}. Did gradlew run with --profile?", file=sys.stderr)
+        return 1
+
+    summary = summarize(reports[-1], args.top)
+    with open(args.output, "w") as f:
+        json.dump(summary, f, indent=2)
+        f.write("\n")
+    print(
+        f"Gradle spent {summary['configuration_time']}s configuring and "
+        f"{summary['task_execution_time']}s executing {summary['task_count']} tasks, "
+        f"{summary['cache_hits']} of them from the build cache"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
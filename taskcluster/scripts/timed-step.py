@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Run one step of a task's command, recording when it started and ended and
+how it exited in a JSON timings file, then exit the way the step did.
+
+Timestamps come from the system-wide monotonic clock, so that the steps of a
+task, each run by its own invocation of this script, can be laid side by side.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+def record_step(output, step):
+    if os.path.exists(output):
+        with open(output) as f:
+            timings = json.load(f)
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        timings = {"steps": []}
+    timings["steps"].append(step)
+    with open(output, "w") as f:
+        json.dump(timings, f, indent=2)
+        f.write("\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--output", required=True, help="JSON file to add the step to")
+    parser.add_argument("--name", required=True, help="what to call the step")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="-- followed by the step")
+    args = parser.parse_args()
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+
+    start = time.monotonic()
+    try:
+        exit_code = subprocess.call(command)
+    except OSError as error:
+        print(f"{command[0]}: {error}", file=sys.stderr)
+        exit_code = 127
+    end = time.monotonic()
+    # Like a shell, report a step killed by a signal as 128 + the signal.
+    if exit_code < 0:
+        exit_code = 128 - exit_code
+
+    record_step(args.output, {
+        "name": args.name,
+        "start": start,
+        "end": end,
+        "seconds": end - start,
+        "exit_code": exit_code,
+    })
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
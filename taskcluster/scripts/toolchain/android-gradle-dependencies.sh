@@ -16,6 +16,34 @@ PROJECT_DIR="$(get_abs_path $CURRENT_DIR/../../../..)"
 
 pushd $PROJECT_DIR
 
+# With PREVIOUS_DEPENDENCIES_INDEX set, seed Nexus' storage with that build of
+# this toolchain, so that only the components added or changed since have to
+# come through the proxy. Its inventory says what it held, so that whatever is
+# no longer needed can be pruned again before packaging. Anything going wrong
+# here just means mirroring everything.
+#
+# This is off unless the task asks for it, because it isn't hermetic: the
+# artifact then depends on what the previous one held, not only on the inputs
+# of the cache key. Files no inventory accounts for, like Nexus' .sha1 files,
+# maven-metadata.xml and the aapt2 binary, are carried over from one artifact
+# to the next rather than fetched afresh, and the seeded storage has none of
+# the .nexus metadata Nexus keeps alongside what it mirrored itself.
+PREVIOUS_ARTIFACT="$NEXUS_WORK/previous-android-gradle-dependencies.tar.zst"
+PREVIOUS_INVENTORY="$NEXUS_WORK/previous-verification-metadata.dryrun.xml"
+mkdir -p "$NEXUS_WORK/storage"
+if [ -n "$PREVIOUS_DEPENDENCIES_INDEX" ] \
+    && $CURL --fail --output "$PREVIOUS_ARTIFACT" \
+        "$TASKCLUSTER_ROOT_URL/api/index/v1/task/$PREVIOUS_DEPENDENCIES_INDEX/artifacts/public/build/android-gradle-dependencies.tar.zst" \
+    && zstd -dc "$PREVIOUS_ARTIFACT" | tar -x --touch -C "$NEXUS_WORK/storage" --strip-components=1 \
+    && [ -f "$NEXUS_WORK/storage/verification-metadata.dryrun.xml" ]; then
+    mv "$NEXUS_WORK/storage/verification-metadata.dryrun.xml" "$PREVIOUS_INVENTORY"
+    rm "$NEXUS_WORK/storage/manifest.txt"
+else
+    echo "Not seeding from a previous artifact; mirroring everything."
+    rm -rf "$NEXUS_WORK/storage"/*
+fi
+rm -f "$PREVIOUS_ARTIFACT"
+
 . taskcluster/scripts/toolchain/android-gradle-dependencies/before.sh
 
 GRADLE_FLAGS=(
@@ -38,6 +66,14 @@ GRADLE_FLAGS=(
 # Don't leave a 4GB heap sitting there while `after.sh` packages everything up.
 ./gradlew --stop
 
+if [ -f "$PREVIOUS_INVENTORY" ]; then
+    python3 taskcluster/scripts/toolchain/android-gradle-dependencies/prune_dependencies.py \
+        --previous-inventory "$PREVIOUS_INVENTORY" \
+        --inventory gradle/verification-metadata.dryrun.xml \
+        ${NEXUS_WORK}/storage/central ${NEXUS_WORK}/storage/google \
+        ${NEXUS_WORK}/storage/gradle-plugins
+fi
+
 . taskcluster/scripts/toolchain/android-gradle-dependencies/after.sh
 
 popd
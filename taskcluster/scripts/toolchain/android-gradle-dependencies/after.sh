@@ -16,30 +16,27 @@ echo "running as" $(id)
 
 set -v
 
-# Resolved before the `pushd` below leaves the project directory.
 DEPENDENCY_INVENTORY="$PWD/gradle/verification-metadata.dryrun.xml"
-VERIFY_DEPENDENCIES="$PWD/taskcluster/scripts/toolchain/android-gradle-dependencies/verify_dependencies.py"
+PACKAGE_DEPENDENCIES="$PWD/taskcluster/scripts/toolchain/android-gradle-dependencies/package_dependencies.py"
 
-# Package everything up.
-pushd $WORKSPACE
-mkdir -p android-gradle-dependencies /builds/worker/artifacts
+mkdir -p /builds/worker/artifacts
 
-cp -R ${NEXUS_WORK}/storage/central android-gradle-dependencies
-cp -R ${NEXUS_WORK}/storage/google android-gradle-dependencies
-cp -R ${NEXUS_WORK}/storage/gradle-plugins android-gradle-dependencies || {
+if [ ! -d ${NEXUS_WORK}/storage/gradle-plugins ]; then
     echo "FATAL ERROR: no gradle-plugins storage. Did plugin resolution reach the proxy?"
     exit 1
-}
+fi
 
+# Package everything up straight from Nexus' storage, hashing each file as it's
+# archived.
 # Bug 1953671: catch intermittently incomplete artifacts here rather than
-# downstream.
+# downstream. Nothing is published unless the check passes.
+# The report records how long each stage took, to keep an eye on how the
+# dependency tree's growth affects this task.
 # The Mozilla repositories in build.gradle are not proxied, so what they serve
 # is legitimately absent from the packaged tree.
-python3 "$VERIFY_DEPENDENCIES" --inventory "$DEPENDENCY_INVENTORY" \
+python3 "$PACKAGE_DEPENDENCIES" --inventory "$DEPENDENCY_INVENTORY" \
     --unproxied org/mozilla \
-    android-gradle-dependencies/central android-gradle-dependencies/google \
-    android-gradle-dependencies/gradle-plugins
-
-tar cavf /builds/worker/artifacts/android-gradle-dependencies.tar.zst android-gradle-dependencies
-
-popd
+    --output /builds/worker/artifacts/android-gradle-dependencies.tar.zst \
+    --report /builds/worker/artifacts/android-gradle-dependencies.json \
+    ${NEXUS_WORK}/storage/central ${NEXUS_WORK}/storage/google \
+    ${NEXUS_WORK}/storage/gradle-plugins
@@ -0,0 +1,178 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Time verify_dependencies.py and package_dependencies.py against a synthetic
+Maven repository, so that changes to them can be compared between commits.
+
+Everything is generated locally from a seed: an inventory in the format
+`--write-verification-metadata` writes, and repository trees for it split across
+central, google and gradle-plugins, with some of the artifacts published under
+Kotlin Multiplatform names that only the content fallback can match. Each stage
+is timed on its own and the results are written out as JSON.
+
+The page cache is warm for every stage after generation, so these are timings
+of the CPU and syscall work rather than of the disk.
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from verify_dependencies import index_repositories, parse_inventory, sha256, verify
+
+# The benchmarks share how they report their results.
+sys.path.append(str(Path(__file__).resolve().parents[3]))
+from rb_taskgraph import benchmarking  # noqa: E402
+
+REPOSITORIES = ("central", "google", "gradle-plugins")
+
+
+def generate(
+    root, components, files_per_component, min_size, max_size, kmp, split, seed
+):
+    """Write an inventory and repositories for it under `root`, returning the
+    inventory's path, the repositories and the total size of the files."""
+    rng = random.Random(seed)
+    repositories = [root / name for name in REPOSITORIES[:split]]
+    total_size = 0
+    inventory = root / "verification-metadata.dryrun.xml"
+    with inventory.open("w") as fh:
+        fh.write(
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<verification-metadata xmlns="https://schema.gradle.org/dependency-verification">\n'
+            "   <configuration>\n"
+            "      <verify-metadata>true</verify-metadata>\n"
+            "   </configuration>\n"
+            "   <components>\n"
+        )
+        for number in range(components):
+            group = f"org.example.group{number % 97}"
+            name = f"module{number}"
+            version = f"1.{number % 13}.{number}"
+            repository = rng.choice(repositories)
+            directory = repository.joinpath(*group.split("."), name, version)
+            directory.mkdir(parents=True, exist_ok=True)
+            fh.write(
+                f'      <component group="{group}" name="{name}" version="{version}">\n'
+            )
+            renamed = rng.random() < kmp
+            for index in range(files_per_component):
+                extension = ("jar", "pom", "module", "aar")[index % 4]
+                filename = f"{name}-{version}-{index}.{extension}"
+                data = rng.randbytes(rng.randint(min_size, max_size))
+                total_size += len(data)
+                # Kotlin Multiplatform publishes the JVM artifact under a
+                # different name to the one the module metadata records.
+                published = f"{name}-jvm-{version}-{index}.{extension}"
+                if not (renamed and extension == "jar"):
+                    published = filename
+                (directory / published).write_bytes(data)
+                fh.write(
+                    f'         <artifact name="{filename}">\n'
+                    f'            <sha256 value="{hashlib.sha256(data).hexdigest()}" '
+                    'origin="Generated by Gradle"/>\n'
+                    "         </artifact>\n"
+                )
+            fh.write("      </component>\n")
+        fh.write("   </components>\n</verification-metadata>\n")
+    return inventory, repositories, total_size
+
+
+def timed(function, *args, **kwargs):
+    start = time.monotonic()
+    result = function(*args, **kwargs)
+    return time.monotonic() - start, result
+
+
+def run_stages(inventory, repositories, jobs, scratch):
+    timings = {}
+    timings["parse"], components = timed(lambda: list(parse_inventory(inventory)))
+    timings["index"], index = timed(index_repositories, repositories)
+    timings["verify"], result = timed(verify, components, index, (), jobs, sha256)
+    if result.problems:
+        raise RuntimeError(f"synthetic repository failed to verify: {result.problems}")
+    # How verify() itself splits that time; "parse" is next to nothing here,
+    # as the inventory has already been read.
+    for stage, seconds in result.timings.items():
+        timings[f"verify.{stage}"] = seconds
+
+    try:
+        from package_dependencies import archive
+    except ImportError:
+        # zstandard isn't installed; the rest is still worth timing.
+        pass
+    else:
+        output = scratch / "android-gradle-dependencies.tar.zst"
+        timings["package"], _ = timed(archive, index, inventory, output)
+        output.unlink()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--components", type=int, default=2000)
+    parser.add_argument("--files-per-component", type=int, default=3)
+    parser.add_argument("--min-size", type=int, default=1024, metavar="BYTES")
+    parser.add_argument("--max-size", type=int, default=256 * 1024, metavar="BYTES")
+    parser.add_argument(
+        "--kmp",
+        type=float,
+        default=0.1,
+        metavar="FRACTION",
+        help="fraction of components whose jars are published under a Kotlin "
+        "Multiplatform name (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--repositories",
+        type=int,
+        choices=range(1, len(REPOSITORIES) + 1),
+        default=len(REPOSITORIES),
+        help="how many repositories to split the components across "
+        "(default: %(default)s)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    benchmarking.add_arguments(parser, "where to generate the repositories")
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(dir=args.workdir, prefix="benchmark-"))
+    try:
+        generation, (inventory, repositories, total_size) = timed(
+            generate,
+            workdir,
+            args.components,
+            args.files_per_component,
+            args.min_size,
+            args.max_size,
+            args.kmp,
+            args.repositories,
+            args.seed,
+        )
+        runs = [
+            run_stages(inventory, repositories, args.jobs, workdir)
+            for _ in range(args.repeat)
+        ]
+    finally:
+        shutil.rmtree(workdir)
+
+    benchmarking.report(args, {
+        "files": args.components * args.files_per_component,
+        "bytes": total_size,
+        "generation": generation,
+        "stages": {
+            stage: statistics.median(run[stage] for run in runs) for stage in runs[0]
+        },
+    })
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
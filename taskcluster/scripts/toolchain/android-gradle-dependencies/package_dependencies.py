@@ -0,0 +1,255 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Package the Gradle dependency cache straight out of Nexus' storage, checking
+it against the inventory on the way.
+
+Each file is read once: the same reads that feed the zstd-compressed tarball
+are hashed, and those digests are checked the way verify_dependencies.py checks
+an unpacked tree. The archive is only moved into place if the check passes, so
+an incomplete cache is never published. The digests are also shipped in the
+archive as a manifest, which `verify_dependencies.py --manifest` checks an
+unpacked copy against.
+
+The archive is reproducible: entries are sorted and their owners, modes and
+mtimes are normalized. The same jars are often in more than one repository, so
+identical files are stored once and hardlinked. Working out which files are
+identical means hashing those that share a size with another file before
+archiving them; those are the only files that are read twice.
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import sys
+import tarfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from verify_dependencies import (
+    MANIFEST,
+    HashCache,
+    index_repositories,
+    parse_inventory,
+    report,
+    sha256,
+    verify,
+    write_report,
+)
+
+# Shared with the other toolchain scripts, one directory up.
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from reproducible_tar import tarinfo, zstd_writer  # noqa: E402
+
+# What the archive unpacks to, and what downstream tasks expect to find in
+# their fetches directory.
+ARCHIVE_ROOT = "android-gradle-dependencies"
+# The inventory is shipped alongside the repositories, so that the next build
+# of the toolchain can tell what changed.
+INVENTORY = "verification-metadata.dryrun.xml"
+
+
+class HashingReader:
+    """File object that hashes whatever is read through it."""
+
+    def __init__(self, fh):
+        self._fh = fh
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self._fh.read(size)
+        self.digest.update(data)
+        return data
+
+
+def archive(index, inventory, output, jobs=None, level=3, hasher=sha256):
+    """Write every file in `index` to the tarball at `output`, followed by a
+    manifest of them and `inventory`. `hasher` gives the digests of the files
+    that have to be hashed before they're archived.
+
+    Returns {path: sha256} for the files, how many bytes hardlinking
+    identical files saved, and how many were read to hash them, counting
+    everything given to `hasher`.
+    """
+    directories = {ARCHIVE_ROOT}
+    files = {}
+    for relative_dir, repositories in index.items():
+        for repository, sizes in repositories.items():
+            arcname = Path(ARCHIVE_ROOT, repository.name, relative_dir)
+            directories.add(str(arcname))
+            for filename, size in sizes.items():
+                files[str(arcname / filename)] = (
+                    repository / relative_dir / filename,
+                    size,
+                )
+
+    # Only files of the same size can be identical.
+    sizes = Counter(size for _, size in files.values())
+    shared = sorted(path for path, size in files.values() if size and sizes[size] > 1)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        digests = dict(zip(shared, executor.map(hasher, shared)))
+    hashed = sum(size for path, size in files.values() if path in digests)
+
+    stored = {}
+    saved = 0
+    manifest = []
+    with output.open("wb") as fh, zstd_writer(
+        fh, level, jobs
+    ) as compressed, tarfile.open(fileobj=compressed, mode="w|") as tar:
+        for name in sorted(directories | files.keys()):
+            if name in directories:
+                tar.addfile(tarinfo(name, type=tarfile.DIRTYPE, mode=0o755))
+                continue
+
+            path, size = files[name]
+            if digests.get(path) in stored:
+                tar.addfile(
+                    tarinfo(name, type=tarfile.LNKTYPE, linkname=stored[digests[path]])
+                )
+                saved += size
+            else:
+                with path.open("rb") as source:
+                    reader = HashingReader(source)
+                    tar.addfile(tarinfo(name, size=size), reader)
+                digests[path] = reader.digest.hexdigest()
+                hashed += size
+                stored[digests[path]] = name
+            manifest.append(
+                (str(Path(name).relative_to(ARCHIVE_ROOT)), size, digests[path])
+            )
+
+        data = "".join(
+            f"{checksum} {size} {relative_path}\n"
+            for relative_path, size, checksum in sorted(manifest)
+        ).encode()
+        tar.addfile(
+            tarinfo(f"{ARCHIVE_ROOT}/{MANIFEST}", size=len(data)), io.BytesIO(data)
+        )
+        data = inventory.read_bytes()
+        tar.addfile(
+            tarinfo(f"{ARCHIVE_ROOT}/{INVENTORY}", size=len(data)), io.BytesIO(data)
+        )
+    return digests, saved, hashed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--inventory",
+        required=True,
+        type=Path,
+        help="verification-metadata.dryrun.xml written by the enumeration pass",
+    )
+    parser.add_argument(
+        "--unproxied",
+        action="append",
+        default=[],
+        metavar="PREFIX",
+        help="path prefix served by a repository that isn't proxied through "
+        "Nexus, so is expected to be absent from the packaged tree; repeatable",
+    )
+    parser.add_argument(
+        "--output",
+        required=True,
+        type=Path,
+        help="where to write the .tar.zst",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        metavar="N",
+        help="number of files to hash, and of zstd threads (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--level",
+        type=int,
+        default=3,
+        help="zstd compression level (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--hash-cache",
+        type=Path,
+        metavar="FILE",
+        help="JSON file of digests to reuse for files that share their size "
+        "with another and whose size, mtime and inode haven't changed since "
+        "the last run; created if absent",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        metavar="FILE",
+        help="also write the results and per-stage timings to FILE as JSON",
+    )
+    parser.add_argument(
+        "repository",
+        nargs="+",
+        type=Path,
+        help="Nexus storage directories to package, e.g. storage/central",
+    )
+    args = parser.parse_args()
+
+    if not args.inventory.is_file():
+        print(
+            f"FATAL ERROR: no inventory at {args.inventory}. Did the "
+            "enumeration pass run?"
+        )
+        return 1
+
+    cache = HashCache(args.hash_cache, args.repository) if args.hash_cache else None
+    start = time.monotonic()
+    index = index_repositories(args.repository)
+    index_time = time.monotonic() - start
+    partial = args.output.with_name(args.output.name + ".partial")
+    start = time.monotonic()
+    try:
+        digests, saved, hashed = archive(
+            index,
+            args.inventory,
+            partial,
+            args.jobs,
+            args.level,
+            cache.sha256 if cache else sha256,
+        )
+    except BaseException:
+        # It would be uploaded along with the task's other artifacts.
+        partial.unlink(missing_ok=True)
+        raise
+    archive_time = time.monotonic() - start
+    if cache:
+        cache.save()
+        print(
+            f"hash cache {args.hash_cache}: {cache.hits} hits, {cache.misses} misses"
+        )
+    result = verify(
+        parse_inventory(args.inventory),
+        index,
+        tuple(args.unproxied),
+        hasher=digests.__getitem__,
+    )
+    result.timings["index"] = index_time
+    # The hashing happened while archiving, so that is what it's measured by.
+    result.timings["archive"] = archive_time
+    result.bytes_hashed = hashed - (cache.bytes_reused if cache else 0)
+    result.hashing_time = archive_time
+    if args.report:
+        write_report(args.report, result, args.inventory)
+    status = report(result, args.inventory)
+    if status:
+        partial.unlink()
+        return status
+
+    partial.replace(args.output)
+    print(
+        f"packaged {len(digests)} files into {args.output}; hardlinking identical "
+        f"files saved {saved} bytes"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Compare the inventory of this build of the dependency toolchain with the one
+shipped in the previous build, and drop from Nexus' storage whatever the
+previous build left there that is no longer needed.
+
+When android-gradle-dependencies.sh seeds Nexus' storage from the previous
+artifact, Gradle only has to fetch the components that were added or changed
+since; everything else is served from the seed. Without this, components that
+are no longer depended upon would be carried over from one artifact to the next
+forever, and so would the files that a changed component no longer has, like a
+classifier that isn't used anymore.
+
+Files that neither inventory accounts for are kept: Nexus' .sha1 and .md5
+files and maven-metadata.xml, but also what Gradle only fetches while tasks
+run, like the aapt2 binary, which the enumeration pass never sees. Those are
+only ever kept alongside a component that is still depended upon, and go with
+it when it no longer is.
+"""
+
+import argparse
+import shutil
+import sys
+from pathlib import Path
+
+from verify_dependencies import parse_inventory, sha256
+
+
+def compare(previous, current):
+    """Return the relative directories of the components that were added,
+    changed and removed going from `previous` to `current`."""
+    added = sorted(current.keys() - previous.keys())
+    removed = sorted(previous.keys() - current.keys())
+    changed = sorted(
+        relative_dir
+        for relative_dir in current.keys() & previous.keys()
+        if current[relative_dir] != previous[relative_dir]
+    )
+    return added, changed, removed
+
+
+def prune(repositories, relative_dirs, keep):
+    """Delete `relative_dirs` from each of `repositories`, along with any
+    parent directory that leaves empty, returning how many were deleted.
+
+    Directories that hold one of the `keep` components are left alone.
+    """
+    ancestors = {parent for relative_dir in keep for parent in relative_dir.parents}
+    pruned = 0
+    for repository in repositories:
+        for relative_dir in relative_dirs:
+            directory = repository / relative_dir
+            if relative_dir in ancestors or not directory.is_dir():
+                continue
+            shutil.rmtree(directory)
+            pruned += 1
+            for parent in directory.parents:
+                if parent == repository or any(parent.iterdir()):
+                    break
+                parent.rmdir()
+    return pruned
+
+
+def prune_files(repositories, changed, previous, current):
+    """Delete from each of `repositories` the files of the `changed`
+    components that only the `previous` inventory accounted for, returning
+    how many were deleted.
+
+    Files are matched by name, and by contents for those published under a
+    different name to the one the inventory records, as Kotlin Multiplatform
+    artifacts are.
+    """
+    pruned = 0
+    for relative_dir in changed:
+        wanted = current[relative_dir]
+        checksums = set(wanted.values())
+        stale_names = previous[relative_dir].keys() - wanted.keys()
+        stale_checksums = set(previous[relative_dir].values()) - checksums - {None}
+        if not stale_names and not stale_checksums:
+            continue
+        for repository in repositories:
+            directory = repository / relative_dir
+            if not directory.is_dir():
+                continue
+            for path in directory.iterdir():
+                if not path.is_file() or path.name in wanted:
+                    continue
+                digest = sha256(path)
+                if digest in checksums:
+                    continue
+                if path.name in stale_names or digest in stale_checksums:
+                    path.unlink()
+                    pruned += 1
+    return pruned
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--previous-inventory",
+        required=True,
+        type=Path,
+        help="inventory shipped in the artifact Nexus' storage was seeded from",
+    )
+    parser.add_argument(
+        "--inventory",
+        required=True,
+        type=Path,
+        help="verification-metadata.dryrun.xml written by the enumeration pass",
+    )
+    parser.add_argument(
+        "repository",
+        nargs="+",
+        type=Path,
+        help="Nexus storage directories to prune, e.g. storage/central",
+    )
+    args = parser.parse_args()
+
+    previous = dict(parse_inventory(args.previous_inventory))
+    current = dict(parse_inventory(args.inventory))
+    added, changed, removed = compare(previous, current)
+    print(
+        f"{len(added)} components added, {len(changed)} changed and "
+        f"{len(removed)} removed since the previous artifact"
+    )
+    for label, relative_dirs in (("added", added), ("changed", changed)):
+        for relative_dir in relative_dirs:
+            print(f"  {label}: {relative_dir}")
+
+    pruned = prune(args.repository, removed, current)
+    print(f"pruned {pruned} directories left over from the previous artifact")
+    pruned = prune_files(args.repository, changed, previous, current)
+    print(f"pruned {pruned} files that changed components no longer have")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
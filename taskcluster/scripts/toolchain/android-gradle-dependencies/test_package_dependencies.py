@@ -0,0 +1,48 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import sys
+
+import pytest
+
+import package_dependencies
+from benchmark_dependencies import generate
+
+
+@pytest.fixture
+def repositories(tmp_path):
+    inventory, repositories, _ = generate(
+        tmp_path, 10, 2, 100, 1000, 0.1, 3, seed=0
+    )
+    return inventory, repositories
+
+
+def run(monkeypatch, inventory, repositories, output):
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["package_dependencies.py", "--inventory", str(inventory)]
+        + ["--output", str(output)]
+        + [str(repository) for repository in repositories],
+    )
+    return package_dependencies.main()
+
+
+def test_packages(monkeypatch, tmp_path, repositories):
+    output = tmp_path / "out" / "android-gradle-dependencies.tar.zst"
+    output.parent.mkdir()
+    assert run(monkeypatch, *repositories, output) == 0
+    assert [path.name for path in output.parent.iterdir()] == [output.name]
+
+
+def test_failed_archive_leaves_nothing_behind(monkeypatch, tmp_path, repositories):
+    def read(self, size=-1):
+        raise OSError("read failed")
+
+    monkeypatch.setattr(package_dependencies.HashingReader, "read", read)
+    output = tmp_path / "out" / "android-gradle-dependencies.tar.zst"
+    output.parent.mkdir()
+    with pytest.raises(OSError, match="read failed"):
+        run(monkeypatch, *repositories, output)
+    assert list(output.parent.iterdir()) == []
@@ -10,29 +10,54 @@ Some of what the inventory lists comes from repositories that aren't proxied
 through Nexus and so is expected to be absent from the packaged tree; --unproxied
 says which paths those are. Anything else absent, or any component packaged with
 one of its files missing, is a real fault.
+
+With --manifest, check an unpacked artifact against the manifest that
+package_dependencies.py ships in it instead, so that a task consuming the
+artifact can tell a bad extraction apart from a Gradle problem.
 """
 
 import argparse
 import hashlib
+import json
+import os
 import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 import xml.etree.ElementTree as ET
 from pathlib import Path
 
+# Written to the root of the artifact by package_dependencies.py, one
+# "<sha256> <size> <path>" line per file.
+MANIFEST = "manifest.txt"
+
 
 def parse_inventory(path):
-    """Yield (relative_directory, {filename: sha256}) for each component."""
-    root = ET.parse(path).getroot()
-    for component in root.iter():
-        if not component.tag.endswith("component"):
+    """Yield (relative_directory, {filename: sha256}) for each component.
+
+    The inventory is streamed: each component is yielded as soon as it closes
+    and is then dropped, so the parse itself never holds more than one
+    component, and the caller can start on the first components before the
+    last have been read.
+    """
+    # Elements still open, so that a finished component can be detached from
+    # its parent; clearing it alone would leave an empty husk behind.
+    open_elements = []
+    for event, element in ET.iterparse(path, events=("start", "end")):
+        if event == "start":
+            open_elements.append(element)
             continue
-        group = component.get("group")
-        name = component.get("name")
-        version = component.get("version")
-        if not (group and name and version):
+        open_elements.pop()
+        if not element.tag.endswith("component"):
             continue
 
+        group = element.get("group")
+        name = element.get("name")
+        version = element.get("version")
         artifacts = {}
-        for artifact in component:
+        for artifact in element:
             if not artifact.tag.endswith("artifact"):
                 continue
             checksum = next(
@@ -45,7 +70,11 @@ def parse_inventory(path):
             )
             artifacts[artifact.get("name")] = checksum
 
-        if artifacts:
+        element.clear()
+        if open_elements:
+            open_elements[-1].remove(element)
+
+        if group and name and version and artifacts:
             yield Path(*group.split("."), name, version), artifacts
 
 
@@ -57,67 +86,416 @@ def sha256(path):
     return digest.hexdigest()
 
 
-def verify(inventory, repositories, unproxied):
-    problems = []
-    unpackaged = []
-    components = checked = artifacts = 0
-
-    for relative_dir, expected in inventory:
-        components += 1
-
-        # Downstream tasks are given every one of these as a repository, so an
-        # artifact only has to be in one of them.
-        directories = [
-            repository / relative_dir
-            for repository in repositories
-            if (repository / relative_dir).is_dir()
-        ]
-        if not directories:
-            if str(relative_dir).startswith(unproxied):
-                unpackaged.append(str(relative_dir))
+class HashCache:
+    """Digests from an earlier run, kept in a JSON file.
+
+    Entries are keyed by the repository's name and the path within it, so the
+    repositories can be given with a different prefix from one run to the
+    next, and are only trusted while the file's size, mtime and inode are
+    unchanged. Only the entries looked up during this run are saved, so the
+    file doesn't grow with everything the tree has ever held.
+
+    Nothing in CI keeps the file between tasks, and every task unpacks Nexus'
+    storage afresh anyway; this is for local runs against the same tree.
+    """
+
+    def __init__(self, path, repositories):
+        self.path = path
+        self.repositories = repositories
+        self.hits = self.misses = 0
+        # Of the files that hit, which didn't have to be read.
+        self.bytes_reused = 0
+        try:
+            with path.open() as fh:
+                self._previous = json.load(fh)
+        except (FileNotFoundError, ValueError):
+            self._previous = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _key(self, path):
+        for repository in self.repositories:
+            try:
+                relative_path = path.relative_to(repository)
+            except ValueError:
+                continue
+            return f"{repository.name}/{relative_path.as_posix()}"
+        return str(path)
+
+    def sha256(self, path):
+        stat = path.stat()
+        stamp = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+        key = self._key(path)
+        entry = self._previous.get(key)
+        if entry and entry[:3] == stamp:
+            digest = entry[3]
+            with self._lock:
+                self.hits += 1
+                self.bytes_reused += stat.st_size
+        else:
+            digest = sha256(path)
+            with self._lock:
+                self.misses += 1
+        self._entries[key] = stamp + [digest]
+        return digest
+
+    def save(self):
+        temporary = self.path.with_name(self.path.name + ".tmp")
+        with temporary.open("w") as fh:
+            json.dump(self._entries, fh, sort_keys=True)
+        temporary.replace(self.path)
+
+
+def index_repositories(repositories):
+    """Return {relative_dir: {repository: {filename: size}}} for everything in
+    `repositories`, walking each of them once.
+
+    Answering every lookup from this rather than probing the filesystem saves
+    tens of thousands of stat calls, which are slow on docker-worker's overlay
+    filesystem.
+    """
+    index = {}
+    for repository in repositories:
+        pending = [Path()]
+        while pending:
+            relative_dir = pending.pop()
+            files = {}
+            with os.scandir(repository / relative_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        # Nexus keeps its own bookkeeping in .nexus and .index.
+                        if not entry.name.startswith("."):
+                            pending.append(relative_dir / entry.name)
+                    elif entry.is_file():
+                        files[entry.name] = entry.stat().st_size
+            index.setdefault(relative_dir, {})[repository] = files
+    return index
+
+
+@dataclass
+class Verification:
+    components: int = 0
+    checked: int = 0
+    artifacts: int = 0
+    unpackaged: list = field(default_factory=list)
+    problems: list = field(default_factory=list)
+    # Packaged files that no inventory artifact accounts for.
+    unexpected: list = field(default_factory=list)
+    # Wall-clock seconds spent in each stage.
+    timings: dict = field(default_factory=dict)
+    # Bytes read to hash them; a hasher that answers from elsewhere, like
+    # HashCache, has to correct this for what it didn't read.
+    bytes_hashed: int = 0
+    # Wall-clock seconds from the first file being handed to the hasher to the
+    # last digest coming back.
+    hashing_time: float = 0.0
+
+
+def _timed(iterable, timings, stage):
+    """Yield from `iterable`, adding the time spent waiting on it to
+    timings[stage]."""
+    iterator = iter(iterable)
+    while True:
+        start = time.monotonic()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timings[stage] = timings.get(stage, 0.0) + time.monotonic() - start
+        yield item
+
+
+def _check(result, relative_dir, expected, found, directories, digests):
+    """Check one component's files against the inventory, given the digests
+    of those that were hashed, returning how long matching by contents took."""
+    result.checked += 1
+    fallback_time = 0.0
+    # What the fallback looks the inventory's checksums up in, built the first
+    # time it's needed.
+    by_digest = None
+    accounted_for = set()
+    for filename, checksum in sorted(expected.items()):
+        if found[filename]:
+            path = found[filename] / relative_dir / filename
+            accounted_for.add(path)
+            if checksum and digests[path] != checksum:
+                result.problems.append(f"corrupt: {path}")
             else:
-                problems.append(f"absent: {relative_dir}")
+                result.artifacts += 1
             continue
 
-        checked += 1
-        checksums = None
-        for filename, checksum in sorted(expected.items()):
-            found = next(
-                (d / filename for d in directories if (d / filename).is_file()), None
+        fallback_start = time.monotonic()
+        if by_digest is None:
+            by_digest = {}
+            for path, digest in digests.items():
+                by_digest.setdefault(digest, path)
+        path = by_digest.get(checksum) if checksum else None
+        if path:
+            accounted_for.add(path)
+            result.artifacts += 1
+        else:
+            result.problems.append(f"missing: {relative_dir}/{filename}")
+        fallback_time += time.monotonic() - fallback_start
+
+    result.unexpected.extend(
+        path
+        for repository, files in directories.items()
+        for path in (repository / relative_dir / filename for filename in files)
+        if path not in accounted_for
+    )
+    return fallback_time
+
+
+def verify(inventory, index, unproxied, jobs=None, hasher=sha256):
+    """Check `inventory` against an `index_repositories()` index, getting the
+    digest of each packaged file that needs one from `hasher`.
+
+    Each component is checked, and dropped, as soon as its files have been
+    hashed, so besides the index itself only the components still waiting on
+    the pool are held.
+    """
+    result = Verification()
+    # Components waiting on their digests, oldest first. Enough of them to
+    # keep every worker busy; past that, reading the inventory waits for the
+    # oldest.
+    pending = deque()
+    in_flight = 16 * (jobs or os.cpu_count() or 1)
+    checked_dirs = set()
+    hashing_started = hashing_finished = None
+    lock = threading.Lock()
+
+    def timed_hasher(path):
+        nonlocal hashing_finished
+        digest = hasher(path)
+        finished = time.monotonic()
+        with lock:
+            hashing_finished = max(hashing_finished or finished, finished)
+        return digest
+
+    # Lookups are answered from the index without reading anything, and each
+    # file is handed to the pool as soon as it's known to be needed, so hashing
+    # overlaps with reading the rest of the inventory. hashlib and file reads
+    # both release the GIL, so threads are enough to keep every core busy.
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+
+        def hash_later(hashing, relative_dir, directories, files):
+            nonlocal hashing_started
+            for repository, filename in files:
+                path = repository / relative_dir / filename
+                if path not in hashing:
+                    if hashing_started is None:
+                        hashing_started = time.monotonic()
+                    hashing[path] = executor.submit(timed_hasher, path)
+                    result.bytes_hashed += directories[repository][filename]
+
+        def oldest_hashed():
+            hashing = pending[0][-1]
+            return all(future.done() for future in hashing.values())
+
+        def check_oldest():
+            relative_dir, expected, found, directories, hashing = pending.popleft()
+            wait_start = time.monotonic()
+            digests = {path: future.result() for path, future in hashing.items()}
+            check_start = time.monotonic()
+            fallback_time = _check(
+                result, relative_dir, expected, found, directories, digests
+            )
+            # Only the time spent waiting on the pool; the rest of the hashing
+            # overlapped with the other stages.
+            result.timings["hash"] = result.timings.get("hash", 0.0) + (
+                check_start - wait_start
             )
-            if found:
-                if checksum and sha256(found) != checksum:
-                    problems.append(f"corrupt: {found}")
+            # The Kotlin Multiplatform fallback is timed on its own.
+            result.timings["fallback"] = (
+                result.timings.get("fallback", 0.0) + fallback_time
+            )
+            result.timings["check"] = result.timings.get("check", 0.0) + (
+                time.monotonic() - check_start - fallback_time
+            )
+
+        for relative_dir, expected in _timed(inventory, result.timings, "parse"):
+            result.components += 1
+
+            # Downstream tasks are given every one of these as a repository,
+            # so an artifact only has to be in one of them.
+            directories = index.get(relative_dir, {})
+            if not directories:
+                if str(relative_dir).startswith(unproxied):
+                    result.unpackaged.append(str(relative_dir))
                 else:
-                    artifacts += 1
+                    result.problems.append(f"absent: {relative_dir}")
                 continue
 
+            checked_dirs.add(relative_dir)
+            found = {
+                filename: next(
+                    (
+                        repository
+                        for repository, files in directories.items()
+                        if filename in files
+                    ),
+                    None,
+                )
+                for filename in expected
+            }
+            hashing = {}
+            hash_later(
+                hashing,
+                relative_dir,
+                directories,
+                (
+                    (repository, filename)
+                    for filename, repository in found.items()
+                    if repository and expected[filename]
+                ),
+            )
             # The inventory records the file name from the module metadata,
             # which for Kotlin Multiplatform is not the name the repository
-            # publishes it under. Fall back to matching the contents.
-            if checksums is None:
-                checksums = {
-                    sha256(path)
-                    for directory in directories
-                    for path in directory.iterdir()
-                    if path.is_file()
-                }
-            if checksum and checksum in checksums:
-                artifacts += 1
-            else:
-                problems.append(f"missing: {relative_dir}/{filename}")
+            # publishes it under. Those have to be matched by contents instead,
+            # against everything the component has.
+            if not all(found.values()):
+                hash_later(
+                    hashing,
+                    relative_dir,
+                    directories,
+                    (
+                        (repository, filename)
+                        for repository, files in directories.items()
+                        for filename in files
+                    ),
+                )
+            pending.append((relative_dir, expected, found, directories, hashing))
+            while pending and (len(pending) > in_flight or oldest_hashed()):
+                check_oldest()
+
+        # Whatever is left once the inventory has been read.
+        while pending:
+            check_oldest()
+    result.timings["lookup"] = time.monotonic() - start - sum(
+        result.timings.get(stage, 0.0)
+        for stage in ("parse", "hash", "fallback", "check")
+    )
+    if hashing_started is not None:
+        result.hashing_time = hashing_finished - hashing_started
+
+    # Files in directories that no component is in.
+    result.unexpected.extend(
+        path
+        for relative_dir, directories in index.items()
+        if relative_dir not in checked_dirs
+        for repository, files in directories.items()
+        for path in (repository / relative_dir / filename for filename in files)
+    )
+    result.problems.sort()
+    result.unexpected.sort()
+    return result
+
+
+def parse_manifest(path):
+    """Yield (relative_path, size, sha256) for each file a manifest lists."""
+    with path.open() as fh:
+        for line in fh:
+            checksum, size, relative_path = line.rstrip("\n").split(" ", 2)
+            yield Path(relative_path), int(size), checksum
+
+
+def verify_manifest(manifest, root, jobs=None, sizes_only=False):
+    """Return the problems with the tree at `root`, sorted, checking it
+    against `manifest`."""
+    problems = []
+    index = index_repositories([root])
+    to_hash = {}
+    for relative_path, size, checksum in manifest:
+        files = index.get(relative_path.parent, {}).get(root, {})
+        if relative_path.name not in files:
+            problems.append(f"missing: {relative_path}")
+        elif files[relative_path.name] != size:
+            problems.append(f"wrong size: {relative_path}")
+        elif not sizes_only:
+            to_hash[root / relative_path] = (relative_path, checksum)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for (relative_path, checksum), digest in zip(
+            to_hash.values(), executor.map(sha256, to_hash)
+        ):
+            if digest != checksum:
+                problems.append(f"corrupt: {relative_path}")
 
-    return components, checked, artifacts, unpackaged, problems
+    return sorted(problems)
+
+
+def write_report(path, result, inventory):
+    """Write what `verify()` found, and how long each stage took, to `path` as
+    JSON."""
+    throughput = None
+    if result.hashing_time:
+        throughput = result.bytes_hashed / result.hashing_time / 1e6
+    with path.open("w") as fh:
+        json.dump(
+            {
+                "inventory": str(inventory),
+                "components": result.components,
+                "checked": result.checked,
+                "artifacts": result.artifacts,
+                "unpackaged": result.unpackaged,
+                "problems": result.problems,
+                "unexpected": [str(path) for path in result.unexpected],
+                "timings": result.timings,
+                "bytes_hashed": result.bytes_hashed,
+                "hashing_mb_per_second": throughput,
+            },
+            fh,
+            indent=2,
+        )
+        fh.write("\n")
+
+
+def report(result, inventory, show_unexpected=False):
+    """Print what `verify()` found, returning the exit status it warrants."""
+    print(
+        f"verified {result.artifacts} artifacts across {result.checked} of "
+        f"{result.components} components; {len(result.unpackaged)} are not "
+        "packaged, coming from a repository we don't proxy"
+    )
+    for path in result.unpackaged:
+        print(f"  not packaged: {path}")
+    print(
+        f"{len(result.unexpected)} packaged files aren't accounted for by the "
+        "inventory"
+    )
+    if show_unexpected:
+        for path in result.unexpected:
+            print(f"  unexpected: {path}")
+
+    if not result.components:
+        print(f"FATAL ERROR: {inventory} lists no components at all.")
+        return 1
+
+    if result.problems:
+        print(f"FATAL ERROR: {len(result.problems)} absent, missing or corrupt:")
+        for problem in result.problems:
+            print(f"  {problem}")
+        print("The dependency cache is incomplete. Try re-running this task.")
+        return 1
+
+    return 0
 
 
 def main():
     parser = argparse.ArgumentParser(description=__doc__)
-    parser.add_argument(
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument(
         "--inventory",
-        required=True,
         type=Path,
         help="verification-metadata.dryrun.xml written by the enumeration pass",
     )
+    mode.add_argument(
+        "--manifest",
+        type=Path,
+        help=f"{MANIFEST} at the root of an unpacked artifact to check it against",
+    )
     parser.add_argument(
         "--unproxied",
         action="append",
@@ -126,14 +504,67 @@ def main():
         help="path prefix served by a repository that isn't proxied through "
         "Nexus, so is expected to be absent from the packaged tree; repeatable",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count(),
+        metavar="N",
+        help="number of files to hash at once (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--hash-cache",
+        type=Path,
+        metavar="FILE",
+        help="JSON file of digests to reuse for files whose size, mtime and "
+        "inode haven't changed since the last run; created if absent",
+    )
+    parser.add_argument(
+        "--show-unexpected",
+        action="store_true",
+        help="list every packaged file that the inventory doesn't account for",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        metavar="FILE",
+        help="with --inventory, also write the results and per-stage timings "
+        "to FILE as JSON",
+    )
+    parser.add_argument(
+        "--sizes-only",
+        action="store_true",
+        help="with --manifest, only compare sizes rather than hashing everything",
+    )
     parser.add_argument(
         "repository",
-        nargs="+",
+        nargs="*",
         type=Path,
         help="packaged repository directories to check, e.g. central google",
     )
     args = parser.parse_args()
 
+    if args.manifest:
+        if not args.manifest.is_file():
+            print(f"FATAL ERROR: no manifest at {args.manifest}.")
+            return 1
+        problems = verify_manifest(
+            parse_manifest(args.manifest),
+            args.manifest.parent,
+            args.jobs,
+            args.sizes_only,
+        )
+        if problems:
+            print(f"FATAL ERROR: {len(problems)} missing, the wrong size or corrupt:")
+            for problem in problems:
+                print(f"  {problem}")
+            print("The fetched dependency cache is damaged. Try re-running this task.")
+            return 1
+        print(f"{args.manifest.parent} matches {args.manifest}")
+        return 0
+
+    if not args.repository:
+        parser.error("--inventory needs the repositories to check")
+
     if not args.inventory.is_file():
         print(
             f"FATAL ERROR: no inventory at {args.inventory}. Did the "
@@ -141,29 +572,28 @@ def main():
         )
         return 1
 
-    components, checked, artifacts, unpackaged, problems = verify(
-        parse_inventory(args.inventory), args.repository, tuple(args.unproxied)
-    )
-    print(
-        f"verified {artifacts} artifacts across {checked} of {components} "
-        f"components; {len(unpackaged)} are not packaged, coming from a "
-        "repository we don't proxy"
+    cache = HashCache(args.hash_cache, args.repository) if args.hash_cache else None
+    start = time.monotonic()
+    index = index_repositories(args.repository)
+    index_time = time.monotonic() - start
+    result = verify(
+        parse_inventory(args.inventory),
+        index,
+        tuple(args.unproxied),
+        args.jobs,
+        cache.sha256 if cache else sha256,
     )
-    for path in unpackaged:
-        print(f"  not packaged: {path}")
-
-    if not components:
-        print(f"FATAL ERROR: {args.inventory} lists no components at all.")
-        return 1
-
-    if problems:
-        print(f"FATAL ERROR: {len(problems)} absent, missing or corrupt:")
-        for problem in problems:
-            print(f"  {problem}")
-        print("The dependency cache is incomplete. Try re-running this task.")
-        return 1
-
-    return 0
+    result.timings["index"] = index_time
+    if cache:
+        result.bytes_hashed -= cache.bytes_reused
+    if args.report:
+        write_report(args.report, result, args.inventory)
+    if cache:
+        cache.save()
+        print(
+            f"hash cache {args.hash_cache}: {cache.hits} hits, {cache.misses} misses"
+        )
+    return report(result, args.inventory, args.show_unexpected)
 
 
 if __name__ == "__main__":
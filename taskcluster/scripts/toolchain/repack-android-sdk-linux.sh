@@ -9,4 +9,9 @@ yes | PATH=$JAVA17PATH "${ANDROID_SDK_ROOT}/cmdline-tools/bin/sdkmanager" --lice
 # It's nice to have the build logs include the state of the world upon completion.
 PATH=$JAVA17PATH "${ANDROID_SDK_ROOT}/cmdline-tools/bin/sdkmanager" --list --sdk_root="${ANDROID_SDK_ROOT}"
 
-tar cf - -C "$ANDROID_SDK_ROOT" . --transform 's,^\./,android-sdk-linux/,' | xz > "$UPLOAD_DIR/android-sdk-linux.tar.xz"
+# Usage: repack-android-sdk-linux.sh ARTIFACT [COMPONENT...]
+# Packs only the given top-level directories of the SDK, if any, so that tasks
+# can fetch just the components they need.
+ARTIFACT="$1"
+shift
+python3 "$(dirname "$0")/repack-android-sdk.py" "$ANDROID_SDK_ROOT" "$UPLOAD_DIR/$ARTIFACT" "$@"
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""Repack an Android SDK directory, or some of its components, into a tarball
+for build, test and lint tasks to fetch.
+
+Every component is packed under the same directory, so that a task fetching a
+few of them unpacks them into a single Android SDK holding just those.
+
+The tarball is reproducible: entries are sorted, owners and mtimes are
+normalized and only the executable bit of the modes is kept, so the same SDK
+always gives the same archive. It is compressed with multithreaded zstd, which
+is much quicker to unpack than xz at a similar size; xz is still available for
+comparison. The size of the archive and how long it took to compress, and then
+to decompress again, are reported.
+"""
+
+import argparse
+import json
+import lzma
+import os
+import sys
+import tarfile
+import time
+from pathlib import Path
+
+import zstandard
+
+from reproducible_tar import tarinfo, zstd_writer
+
+FORMATS = ("zst", "xz")
+
+
+def _tarinfo(name, path=None):
+    """Return a TarInfo for `path` stored as `name`, with everything that
+    varies between runs, or between machines, fixed."""
+    info = tarinfo(name)
+    if path is None:
+        info.type = tarfile.DIRTYPE
+        info.mode = 0o755
+    elif path.is_symlink():
+        info.type = tarfile.SYMTYPE
+        info.linkname = os.readlink(path)
+        info.mode = 0o777
+    elif path.is_dir():
+        info.type = tarfile.DIRTYPE
+        info.mode = 0o755
+    else:
+        stat = path.stat()
+        info.size = stat.st_size
+        if stat.st_mode & 0o111:
+            info.mode = 0o755
+    return info
+
+
+def walk(source, components=()):
+    """Return the paths under `source` relative to it, sorted, without
+    following symlinks. If `components` are given, only the paths under those
+    top-level directories are returned."""
+    paths = []
+    for directory, dirnames, filenames in os.walk(source):
+        relative = Path(directory).relative_to(source)
+        if components and relative == Path("."):
+            missing = set(components) - set(dirnames)
+            if missing:
+                raise FileNotFoundError(
+                    f"no {', '.join(sorted(missing))} in {source}"
+                )
+            dirnames[:] = [name for name in dirnames if name in components]
+            filenames = []
+        paths.extend(relative / name for name in dirnames + filenames)
+    return sorted(paths)
+
+
+def open_compressed(fh, fmt, level, threads):
+    if fmt == "zst":
+        return zstd_writer(fh, level, threads)
+    return lzma.LZMAFile(fh, "w", preset=level)
+
+
+def open_decompressed(fh, fmt):
+    if fmt == "zst":
+        return zstandard.ZstdDecompressor().stream_reader(fh)
+    return lzma.LZMAFile(fh)
+
+
+def repack(
+    source, output, prefix, fmt="zst", level=None, threads=None, components=()
+):
+    """Write `source`, or only its `components`, to `output` with its
+    contents under `prefix`, returning how many entries were written."""
+    if level is None:
+        level = 10 if fmt == "zst" else 6
+    paths = walk(source, components)
+    with output.open("wb") as fh, open_compressed(
+        fh, fmt, level, threads
+    ) as compressed, tarfile.open(fileobj=compressed, mode="w|") as tar:
+        tar.addfile(_tarinfo(prefix))
+        for relative in paths:
+            path = source / relative
+            info = _tarinfo(f"{prefix}/{relative}", path)
+            if info.isreg():
+                with path.open("rb") as data:
+                    tar.addfile(info, data)
+            else:
+                tar.addfile(info)
+    return len(paths) + 1
+
+
+def decompression_time(output, fmt):
+    """Return how long reading back all of `output` takes."""
+    start = time.monotonic()
+    with output.open("rb") as fh, open_decompressed(fh, fmt) as reader:
+        while reader.read(1024 * 1024):
+            pass
+    return time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--prefix",
+        default="android-sdk-linux",
+        help="directory the archive unpacks to (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        help="compression to use (default: from the output's extension)",
+    )
+    parser.add_argument(
+        "--level",
+        type=int,
+        help="compression level (default: 10 for zstd, 6 for xz)",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=os.cpu_count(),
+        metavar="N",
+        help="number of zstd threads (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        metavar="FILE",
+        help="also write the size and timings to FILE as JSON",
+    )
+    parser.add_argument("source", type=Path, help="the Android SDK to repack")
+    parser.add_argument("output", type=Path, help="where to write the tarball")
+    parser.add_argument(
+        "component",
+        nargs="*",
+        help="top-level directories of the SDK to pack, e.g. cmdline-tools "
+        "(default: all of it)",
+    )
+    args = parser.parse_args()
+
+    fmt = args.format or args.output.suffix.lstrip(".")
+    if fmt not in FORMATS:
+        parser.error(f"can't tell the format of {args.output}; pass --format")
+
+    start = time.monotonic()
+    entries = repack(
+        args.source,
+        args.output,
+        args.prefix,
+        fmt,
+        args.level,
+        args.threads,
+        args.component,
+    )
+    results = {
+        "entries": entries,
+        "size": args.output.stat().st_size,
+        "format": fmt,
+        "compression_time": time.monotonic() - start,
+        "decompression_time": decompression_time(args.output, fmt),
+    }
+    print(
+        f"wrote {results['entries']} entries to {args.output}: "
+        f"{results['size']} bytes, compressed in "
+        f"{results['compression_time']:.1f}s, decompresses in "
+        f"{results['decompression_time']:.1f}s"
+    )
+    if args.report:
+        with args.report.open("w") as fh:
+            json.dump(results, fh, indent=2)
+            fh.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
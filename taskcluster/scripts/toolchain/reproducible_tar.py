@@ -0,0 +1,32 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this
+# file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+"""What the toolchain scripts share to write tarballs that are the same byte
+for byte whenever their contents are, whatever machine writes them."""
+
+import tarfile
+
+import zstandard
+
+
+def tarinfo(name, **attributes):
+    """Return a TarInfo for `name` with everything that varies between runs,
+    or between machines, fixed, and then `attributes` set on it."""
+    info = tarfile.TarInfo(name)
+    info.mode = 0o644
+    info.mtime = 0
+    info.uid = info.gid = 0
+    info.uname = info.gname = ""
+    for attribute, value in attributes.items():
+        setattr(info, attribute, value)
+    return info
+
+
+def zstd_writer(fh, level, threads=None):
+    """Return a stream writing to `fh` compressed with zstd at `level`, using
+    `threads` threads, or as many as there are cores if not given."""
+    # Multithreaded zstd gives the same output whatever the number of threads,
+    # so the archive doesn't depend on the machine it was made on.
+    compressor = zstandard.ZstdCompressor(level=level, threads=threads or -1)
+    return compressor.stream_writer(fh)